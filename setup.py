@@ -8,6 +8,7 @@ VERSION = "3.1.1"
 
 REQUIREMENTS = [
     "azure-kusto-data==4.*",
+    "msal-extensions>=0.3",
     "sqlalchemy==1.4.*",
     "typing-extensions>=3.10",
 ]
@@ -1,17 +1,28 @@
+import copy
+import datetime
+import json
+import logging
+import os
+import re
+import uuid
 from collections import namedtuple
-from typing import Any
-
-from azure.kusto.data import (
-    ClientRequestProperties,
-    KustoClient,
-    KustoConnectionStringBuilder,
-)
-from azure.identity import DefaultAzureCredential
-from azure.kusto.data._models import KustoResultColumn
-from azure.kusto.data.exceptions import KustoAuthenticationError, KustoServiceError
+from collections.abc import Callable
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any
 
 from sqlalchemy_kusto import errors
 
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    # The Azure SDK is heavy to import, so it is only loaded on the first `connect()`.
+    # SQLAlchemy imports dialect packages during entry-point discovery even when
+    # the process never talks to Kusto.
+    from azure.kusto.data import ClientRequestProperties, KustoClient
+    from azure.kusto.data._models import KustoResultColumn
+
+    from sqlalchemy_kusto.token_cache import CachedTokenCredential, TokenCache
+
 
 def check_closed(func):
     """Decorator that checks if connection/cursor is closed."""
@@ -46,6 +57,13 @@ def connect(
     azure_ad_tenant_id: str | None = None,
     app_name: str | None = None,
     app_version: str | None = None,
+    token_cache_path: str | None = None,
+    token_cache_allow_unencrypted: bool = False,
+    token_cache: "TokenCache | None" = None,
+    http_pool_maxsize: int | None = None,
+    http_keep_alive: bool = True,
+    proxy: str | None = None,
+    query_parameters: bool = False,
 ):  # pylint: disable=too-many-positional-arguments
     """Return a connection to the database."""
     return Connection(
@@ -59,6 +77,13 @@ def connect(
         azure_ad_tenant_id,
         app_name,
         app_version,
+        token_cache_path=token_cache_path,
+        token_cache_allow_unencrypted=token_cache_allow_unencrypted,
+        token_cache=token_cache,
+        http_pool_maxsize=http_pool_maxsize,
+        http_keep_alive=http_keep_alive,
+        proxy=proxy,
+        query_parameters=query_parameters,
     )
 
 
@@ -77,12 +102,51 @@ class Connection:
         azure_ad_tenant_id: str | None = None,
         app_name: str | None = None,
         app_version: str | None = None,
+        token_cache_path: str | None = None,
+        token_cache_allow_unencrypted: bool = False,
+        token_cache: "TokenCache | None" = None,
+        http_pool_maxsize: int | None = None,
+        http_keep_alive: bool = True,
+        proxy: str | None = None,
+        query_parameters: bool = False,
     ):
+        from azure.kusto.data import (  # noqa: PLC0415
+            ClientRequestProperties,
+            KustoClient,
+            KustoConnectionStringBuilder,
+        )
+
         self.closed = False
         self.cursors: list[Cursor] = []
         kcsb = None
 
-        if azure_ad_client_id and azure_ad_client_secret and azure_ad_tenant_id:
+        if token_cache is None and token_cache_path:
+            from sqlalchemy_kusto.token_cache import FileTokenCache  # noqa: PLC0415
+
+            token_cache = FileTokenCache(
+                token_cache_path, allow_unencrypted=token_cache_allow_unencrypted
+            )
+
+        has_service_principal = bool(
+            azure_ad_client_id and azure_ad_client_secret and azure_ad_tenant_id
+        )
+        if token_cache is not None and (
+            has_service_principal or workload_identity or msi
+        ):
+            # Tokens are shared with other processes through the cache, so the credential
+            # is built here instead of letting the Kusto client hold its own token.
+            kcsb = KustoConnectionStringBuilder.with_azure_token_credential(
+                cluster,
+                self._get_cached_credential(
+                    token_cache,
+                    workload_identity=workload_identity,
+                    user_msi=user_msi,
+                    azure_ad_client_id=azure_ad_client_id,
+                    azure_ad_client_secret=azure_ad_client_secret,
+                    azure_ad_tenant_id=azure_ad_tenant_id,
+                ),
+            )
+        elif has_service_principal:
             # Service Principal auth
             kcsb = KustoConnectionStringBuilder.with_aad_application_key_authentication(
                 connection_string=cluster,
@@ -91,6 +155,10 @@ class Connection:
                 authority_id=azure_ad_tenant_id,
             )
         elif workload_identity:
+            from azure.identity import (  # noqa: PLC0415
+                DefaultAzureCredential,
+            )
+
             kcsb = KustoConnectionStringBuilder.with_azure_token_credential(
                 cluster, DefaultAzureCredential()
             )
@@ -116,8 +184,83 @@ class Connection:
             app_version,
         )
         self.kusto_client = KustoClient(kcsb)
+        if http_pool_maxsize is not None or not http_keep_alive:
+            self._configure_http_adapter(http_pool_maxsize, http_keep_alive)
+        if proxy:
+            self.kusto_client.set_proxy(proxy)
         self.database = database
         self.properties = ClientRequestProperties()
+        self.query_parameters = query_parameters
+
+    def _configure_http_adapter(self, pool_maxsize: int | None, keep_alive: bool):
+        """
+        Replaces the HTTP adapter of the Kusto client session to apply connection pool settings.
+        The adapter is an internal of the Kusto client, so the settings are skipped with a warning
+        when the installed azure-kusto-data release doesn't have it.
+        """
+        from azure.kusto.data import client  # noqa: PLC0415
+        from urllib3.connection import HTTPConnection  # noqa: PLC0415
+
+        if not hasattr(client, "HTTPAdapterWithSocketOptions") or not all(
+            hasattr(self.kusto_client, name)
+            for name in ("_session", "_max_pool_size", "compose_socket_options")
+        ):
+            logger.warning(
+                "http_pool_maxsize and http_keep_alive are not supported by the installed azure-kusto-data, "
+                "default HTTP connection settings are used"
+            )
+            return
+        if pool_maxsize is not None:
+            # Keeps the size when the client rebuilds the adapter, e.g. in `set_http_retries`
+            self.kusto_client._max_pool_size = pool_maxsize
+        socket_options = list(HTTPConnection.default_socket_options or [])
+        if keep_alive:
+            socket_options += self.kusto_client.compose_socket_options()
+        adapter = client.HTTPAdapterWithSocketOptions(
+            socket_options=socket_options,
+            pool_maxsize=self.kusto_client._max_pool_size,
+        )
+        self.kusto_client._session.mount("http://", adapter)
+        self.kusto_client._session.mount("https://", adapter)
+
+    @staticmethod
+    def _get_cached_credential(
+        token_cache: "TokenCache",
+        *,
+        workload_identity: bool,
+        user_msi: str | None,
+        azure_ad_client_id: str | None,
+        azure_ad_client_secret: str | None,
+        azure_ad_tenant_id: str | None,
+    ) -> "CachedTokenCredential":
+        """Builds the Azure credential for the configured auth method wrapped with the token cache."""
+        from azure.identity import (  # noqa: PLC0415
+            ClientSecretCredential,
+            DefaultAzureCredential,
+            ManagedIdentityCredential,
+        )
+
+        from sqlalchemy_kusto.token_cache import CachedTokenCredential  # noqa: PLC0415
+
+        credential: Any
+        if azure_ad_client_id and azure_ad_client_secret and azure_ad_tenant_id:
+            # Service Principal auth
+            credential = ClientSecretCredential(
+                azure_ad_tenant_id, azure_ad_client_id, azure_ad_client_secret
+            )
+            identity = f"sp:{azure_ad_tenant_id}:{azure_ad_client_id}"
+        elif workload_identity:
+            credential = DefaultAzureCredential()
+            # The workload identity is configured by the environment of the process
+            identity = (
+                f"workload_identity:{os.environ.get('AZURE_TENANT_ID')}"
+                f":{os.environ.get('AZURE_CLIENT_ID')}"
+            )
+        else:
+            # Managed Service Identity (MSI)
+            credential = ManagedIdentityCredential(client_id=user_msi or None)
+            identity = f"msi:{user_msi or 'system'}"
+        return CachedTokenCredential(credential, token_cache, identity)
 
     @check_closed
     def close(self):
@@ -138,6 +281,7 @@ class Connection:
             self.kusto_client,
             self.database,
             self.properties,
+            self.query_parameters,
         )
 
         self.cursors.append(cursor)
@@ -162,15 +306,52 @@ CursorDescriptionRow = namedtuple(
 )
 
 
+def format_datetime(value: datetime.date) -> str:
+    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return f"datetime({value.isoformat()})"
+
+
+def format_timespan(value: datetime.timedelta) -> str:
+    """Formats timedelta as KQL timespan [-]d.hh:mm:ss.fffffff."""
+    sign = "-" if value < datetime.timedelta(0) else ""
+    value = abs(value)
+    hours, remainder = divmod(value.seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return (
+        f"time({sign}{value.days}.{hours:02}:{minutes:02}:{seconds:02}"
+        f".{value.microseconds:06}0)"
+    )
+
+
+# Python type, KQL type and literal formatter of query parameters. Other values are sent as dynamic.
+# Note that bool is a subclass of int and datetime is a subclass of date so order matters.
+query_parameter_types: list[tuple[type, str, Callable[[Any], str]]] = [
+    (str, "string", lambda value: value),
+    (bool, "bool", lambda value: "true" if value else "false"),
+    (int, "long", str),
+    (float, "real", repr),
+    (Decimal, "decimal", lambda value: f"decimal({value})"),
+    (datetime.date, "datetime", format_datetime),
+    (datetime.timedelta, "timespan", format_timespan),
+    (uuid.UUID, "guid", lambda value: f"guid({value})"),
+]
+
+
 class Cursor:
     """Connection cursor."""
 
     def __init__(
         self,
-        kusto_client: KustoClient,
+        kusto_client: "KustoClient",
         database: str,
-        properties: ClientRequestProperties | None = None,
+        properties: "ClientRequestProperties | None" = None,
+        query_parameters: bool = False,
     ):
+        from azure.kusto.data import (  # noqa: PLC0415
+            ClientRequestProperties,
+        )
+
         self._results: list[tuple[Any, ...]] | None = None
         self.kusto_client = kusto_client
         self.database = database
@@ -180,6 +361,7 @@ class Cursor:
         self.properties = (
             properties if properties is not None else ClientRequestProperties()
         )
+        self.query_parameters = query_parameters
 
     @property
     @check_result
@@ -198,16 +380,35 @@ class Cursor:
     @check_closed
     def execute(self, operation, parameters=None) -> "Cursor":
         """Executes query. Supports only SELECT statements."""
+        from azure.kusto.data.exceptions import (  # noqa: PLC0415
+            KustoAuthenticationError,
+            KustoServiceError,
+        )
+
         if operation.lower().startswith("select"):
             self.properties.set_option("query_language", "sql")
         else:
             self.properties.set_option("query_language", "kql")
 
-        query = Cursor._apply_parameters(operation, parameters)
+        properties = self.properties
+        if (
+            self.query_parameters
+            and parameters
+            and properties.get_option("query_language", "kql") == "kql"
+        ):
+            query, query_parameters = Cursor._declare_query_parameters(
+                operation, parameters
+            )
+            # Parameters are set on a copy to keep the connection properties untouched
+            properties = copy.deepcopy(self.properties)
+            for name, value in query_parameters.items():
+                properties.set_parameter(name, value)
+        else:
+            query = Cursor._apply_parameters(operation, parameters)
         query = query.rstrip()
         try:
             server_response = self.kusto_client.execute(
-                self.database, query, self.properties
+                self.database, query, properties
             )
         except KustoServiceError as kusto_error:
             raise errors.DatabaseError(str(kusto_error)) from kusto_error
@@ -279,7 +480,7 @@ class Cursor:
 
     @staticmethod
     def _get_description_from_columns(
-        columns: list[KustoResultColumn],
+        columns: list["KustoResultColumn"],
     ) -> list[CursorDescriptionRow]:
         """Gets CursorDescriptionRow for Kusto columns."""
         return [
@@ -317,6 +518,45 @@ class Cursor:
         }
         return operation % escaped_parameters
 
+    @staticmethod
+    def _declare_query_parameters(
+        operation: str, parameters: dict
+    ) -> tuple[str, dict[str, str]]:
+        """
+        Replaces parameter placeholders with query parameters declared in the query header.
+        Returns the query and the parameter values to send with the request properties.
+        """
+        names: dict[str, str] = {}
+
+        def replacer(match: re.Match) -> str:
+            if match.group(1) is None:
+                # Escaped percent sign
+                return "%"
+            name = match.group(1)
+            if name not in names:
+                names[name] = f"_p{len(names)}"
+            return names[name]
+
+        query = re.sub(r"%%|%\(([^)]+)\)s", replacer, operation)
+        if not names:
+            return query, {}
+
+        declarations = []
+        values = {}
+        for name, query_parameter_name in names.items():
+            kql_type, value = Cursor._to_query_parameter(parameters[name])
+            declarations.append(f"{query_parameter_name}:{kql_type}")
+            values[query_parameter_name] = value
+        return f"declare query_parameters({', '.join(declarations)});\n{query}", values
+
+    @staticmethod
+    def _to_query_parameter(value: Any) -> tuple[str, str]:
+        """Returns KQL type and value of the query parameter."""
+        for python_type, kql_type, formatter in query_parameter_types:
+            if isinstance(value, python_type):
+                return kql_type, formatter(value)
+        return "dynamic", f"dynamic({json.dumps(value, default=str)})"
+
     @staticmethod
     def _escape(value: Any) -> str:
         """
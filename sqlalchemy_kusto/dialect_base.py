@@ -1,4 +1,6 @@
 import json
+import logging
+import threading
 from abc import ABC
 from types import ModuleType
 from typing import Any
@@ -18,6 +20,11 @@ from sqlalchemy.types import (
 
 import sqlalchemy_kusto
 
+logger = logging.getLogger(__name__)
+
+# Cheapest query that still goes through authentication and the HTTP connection.
+WARMUP_QUERY = "print warmup = 1"
+
 
 def parse_bool_argument(value: str) -> bool:
     if value in ("True", "true"):
@@ -71,7 +78,15 @@ class KustoBaseDialect(default.DefaultDialect, ABC):
         "azure_ad_tenant_id": str,
         "user_msi": str,
         "dev_mode": parse_bool_argument,
+        "token_cache_path": str,
+        "token_cache_allow_unencrypted": parse_bool_argument,
+        "http_pool_maxsize": int,
+        "http_keep_alive": parse_bool_argument,
+        "proxy": str,
+        "query_parameters": parse_bool_argument,
     }
+    # Number of pooled connections opened in the background right after the engine is created.
+    warmup_connections = 0
 
     @classmethod
     def dbapi(cls) -> ModuleType:
@@ -90,8 +105,43 @@ class KustoBaseDialect(default.DefaultDialect, ABC):
             if name in kwargs:
                 kwargs[name] = parse_func(url.query[name])
 
+        # Warm-up options configure the engine, not the DBAPI connection
+        warmup = parse_bool_argument(kwargs.pop("warmup", "false"))
+        warmup_connections = int(kwargs.pop("warmup_connections", 1))
+        self.warmup_connections = warmup_connections if warmup else 0
+
         return [], kwargs
 
+    @classmethod
+    def engine_created(cls, engine) -> None:
+        """Starts the background warm-up of the connection pool when `warmup=true` is set in the URL."""
+        if engine.dialect.warmup_connections > 0:
+            threading.Thread(
+                target=cls._warm_up,
+                args=(engine, engine.dialect.warmup_connections),
+                name="sqlalchemy-kusto-warmup",
+                daemon=True,
+            ).start()
+
+    @staticmethod
+    def _warm_up(engine, connections: int) -> None:
+        """
+        Opens pooled connections and runs a trivial query on each of them, so the credential is built,
+        the token is acquired and the HTTP connection is established before the first user query.
+        """
+        raw_connections = []
+        try:
+            for _ in range(connections):
+                raw_connection = engine.raw_connection()
+                raw_connections.append(raw_connection)
+                raw_connection.cursor().execute(WARMUP_QUERY)
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("Kusto connection warm-up failed: %s", error)
+        finally:
+            # Connections go back to the pool and are reused by the following queries
+            for raw_connection in raw_connections:
+                raw_connection.close()
+
     def get_schema_names(self, connection: Connection, **kwargs) -> list[str]:
         result = connection.execute(".show databases | project DatabaseName")
         return [row.DatabaseName for row in result]
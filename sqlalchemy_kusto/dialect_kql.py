@@ -1,10 +1,25 @@
+import datetime
+import functools
+import json
 import logging
+import math
 import re
+import threading
+from collections import Counter, OrderedDict, namedtuple
+from collections.abc import Callable
+from typing import Any
 
 from sqlalchemy import Column, exc, sql
+from sqlalchemy.engine import default
+from sqlalchemy.engine.url import URL
 from sqlalchemy.sql import compiler, operators, selectable
+from sqlalchemy.sql.base import NO_ARG, ExecutableOption
 from sqlalchemy.sql.compiler import OPERATORS
+from sqlalchemy.sql.traversals import HasCacheKey
+from sqlalchemy.sql import sqltypes, visitors
+from sqlalchemy.sql.visitors import InternalTraversal
 
+from sqlalchemy_kusto.dbapi import format_datetime, format_timespan
 from sqlalchemy_kusto.dialect_base import KustoBaseDialect
 
 logger = logging.getLogger(__name__)
@@ -65,7 +80,178 @@ kql_aggregates = {
     "varianceif",
     "variancep",
 }
-AGGREGATE_PATTERN = r"(\w+)\s*\(\s*(DISTINCT|distinct\s*)?\(?\s*(\*|\[?\"?\'?\w+\"?\]?)\s*(,.+)*\)?\s*\)"
+AGGREGATE_PATTERN = re.compile(
+    r"(\w+)\s*\(\s*(DISTINCT|distinct\s*)?\(?\s*(\*|\[?\"?\'?\w+\"?\]?)\s*(,.+)*\)?\s*\)",
+    re.IGNORECASE,
+)
+
+# KQL functions of SQL scalar functions with the same arguments, compiled during the tree walk.
+# Functions with different arguments are compiled by visit_<name>_func methods of the compiler.
+functions_sql_to_kql = {
+    "abs": "abs",
+    "ceil": "ceiling",
+    "ceiling": "ceiling",
+    "char_length": "strlen",
+    "coalesce": "coalesce",
+    "concat": "strcat",
+    "current_timestamp": "now",
+    "exp": "exp",
+    "length": "strlen",
+    "ln": "log",
+    "log10": "log10",
+    "lower": "tolower",
+    "now": "now",
+    "power": "pow",
+    "round": "round",
+    "sqrt": "sqrt",
+    "upper": "toupper",
+}
+# Periods of date_add('<unit>', amount, column), the same units are parts of extract('<field>', column)
+datetime_periods = {
+    "year",
+    "quarter",
+    "month",
+    "week",
+    "day",
+    "hour",
+    "minute",
+    "second",
+    "millisecond",
+    "microsecond",
+    "nanosecond",
+}
+# KQL expressions of extract() fields that are not datetime_part() parts, {expr} is replaced by the column
+extract_fields_sql_to_kql = {
+    "week": "week_of_year({expr})",
+    "dow": "toint(dayofweek({expr}) / 1d)",
+    "doy": "dayofyear({expr})",
+    "epoch": "datetime_diff('second', {expr}, datetime(1970-01-01))",
+}
+
+# Operators applied to the result of the KQL union operator
+compound_operators_sql_to_kql = {
+    selectable.CompoundSelect.UNION_ALL: "",
+    selectable.CompoundSelect.UNION: "| distinct *",
+}
+
+# KQL expressions of Superset time grains (ISO 8601 durations), {col} is replaced by the quoted column name.
+# Kusto weeks start on Sunday.
+time_grain_expressions = {
+    None: "{col}",
+    "PT1S": "bin({col}, 1s)",
+    "PT5S": "bin({col}, 5s)",
+    "PT30S": "bin({col}, 30s)",
+    "PT1M": "bin({col}, 1m)",
+    "PT5M": "bin({col}, 5m)",
+    "PT10M": "bin({col}, 10m)",
+    "PT15M": "bin({col}, 15m)",
+    "PT30M": "bin({col}, 30m)",
+    "PT1H": "bin({col}, 1h)",
+    "PT6H": "bin({col}, 6h)",
+    "P1D": "startofday({col})",
+    "P1W": "startofweek({col})",
+    "P1M": "startofmonth({col})",
+    "P3M": "datetime_add('month', -((getmonth({col}) - 1) % 3), startofmonth({col}))",
+    "P1Y": "startofyear({col})",
+    # Weeks starting on Sunday or Monday and ending on Saturday or Sunday
+    "1969-12-28T00:00:00Z/P1W": "startofweek({col})",
+    "1969-12-29T00:00:00Z/P1W": "startofweek({col} - 1d) + 1d",
+    "P1W/1970-01-03T00:00:00Z": "startofweek({col}) + 6d",
+    "P1W/1970-01-04T00:00:00Z": "startofweek({col} - 1d) + 7d",
+}
+# Time grains of date_trunc(unit, column) units
+date_trunc_time_grains = {
+    "second": "PT1S",
+    "minute": "PT1M",
+    "hour": "PT1H",
+    "day": "P1D",
+    # SQL weeks start on Monday, KQL startofweek() on Sunday
+    "week": "1969-12-29T00:00:00Z/P1W",
+    "month": "P1M",
+    "quarter": "P3M",
+    "year": "P1Y",
+}
+
+# Aggregates computed by Kusto with estimation algorithms (HyperLogLog, T-Digest)
+APPROXIMATE_AGGREGATE_PATTERN = re.compile(
+    r"\b(dcount|dcountif|hll|percentile|percentiles|percentilew|percentilesw|tdigest)\("
+)
+DCOUNT_PATTERN = re.compile(r"\bdcount\(([^(),]+)\)")
+
+# Filters evaluated first, as Kusto skips data extents outside of the datetime range
+datetime_range_operators = {
+    operators.gt,
+    operators.ge,
+    operators.lt,
+    operators.le,
+    operators.between_op,
+}
+DATETIME_RANGE_PATTERN = re.compile(
+    r"^\(?\s*[\w\[\]\"]+\s*(>|>=|<|<=|between)\s*\(?\s*(datetime|ago|now)\("
+)
+# Filters that can't use the term index, evaluated after the other filters
+EXPENSIVE_PREDICATE_PATTERN = re.compile(
+    r"\s!?(contains|contains_cs|endswith|endswith_cs|matches regex)\s"
+)
+
+# Row number column of OFFSET pagination, removed from the result
+row_number_column = "_rn"
+
+# Window functions computed on serialized rows, window_rank_functions take the ORDER BY column as the term
+window_rank_functions = {
+    "rank": "row_rank_min",
+    "dense_rank": "row_rank_dense",
+}
+window_offset_functions = {
+    "lag": "prev",
+    "lead": "next",
+}
+# KQL types of SQL expression types, other expressions are dynamic
+kql_types = [
+    (sqltypes.Boolean, "bool"),
+    (sqltypes.Integer, "long"),
+    (sqltypes.Numeric, "real"),
+    (sqltypes.String, "string"),
+    (sqltypes.DateTime, "datetime"),
+    (sqltypes.Date, "datetime"),
+    (sqltypes.Interval, "timespan"),
+]
+
+# How LIKE '%value%' is translated:
+#   - has: term match (has/has_cs), uses the term index but only matches whole terms;
+#   - contains: substring match (contains/contains_cs), keeps SQL semantics but can't use the term index;
+#   - term: has when the value is a single indexable term, contains otherwise, values inside longer terms are missed;
+#   - auto: the fastest substring match with SQL semantics, has is never used as it only matches whole terms.
+LIKE_POLICY_HAS = "has"
+LIKE_POLICY_CONTAINS = "contains"
+LIKE_POLICY_TERM = "term"
+LIKE_POLICY_AUTO = "auto"
+like_policies = {
+    LIKE_POLICY_HAS,
+    LIKE_POLICY_CONTAINS,
+    LIKE_POLICY_TERM,
+    LIKE_POLICY_AUTO,
+}
+# Kusto indexes terms, i.e. runs of alphanumeric characters, of at least 3 characters
+TERM_PATTERN = re.compile(r"^[A-Za-z0-9]{3,}$")
+
+# Patterns applied to every column name, compiled once instead of on each call
+KQL_FUNCTION_PATTERN = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_]*\s*\(")
+NUMBER_LITERAL_PATTERN = re.compile(r"^[0-9]+$")
+IDENTIFIER_PATTERN = re.compile(r"^\w+$")
+# Escape sequences of characters in KQL string literals
+kql_string_escapes = str.maketrans(
+    {"\\": "\\\\", "'": "\\'", "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+)
+# Placeholder of a value rendered when the statement is executed
+POST_COMPILE_PATTERN = re.compile(r"^__\[POSTCOMPILE_\w+\]$")
+QUOTED_FUNCTION_ARGUMENT_PATTERN = re.compile(r'(\w+)\(\s*"([^"]+)"')
+TABLE_PREFIX_PATTERN = re.compile(r'(?:\["?)(\w+)(["?]\])?\.')
+SCHEMA_TABLE_PATTERN = re.compile(
+    r"^\[?([a-zA-Z0-9]+\b|\"[a-zA-Z0-9 \-_.]+\")?\]?\.?\[?([a-zA-Z0-9]+\b|\"[a-zA-Z0-9 \-_.]+\")\]?"
+)
+# Number of memoized identifier quotings, the same columns are quoted again in every query
+QUOTING_CACHE_SIZE = 4096
 
 
 class UniversalSet:
@@ -81,13 +267,154 @@ class KustoKqlIdentifierPreparer(compiler.IdentifierPreparer):
         super().__init__(dialect, initial_quote='["', final_quote='"]', **kw)
 
 
+CompiledCacheInfo = namedtuple(
+    "CompiledCacheInfo", ["hits", "misses", "maxsize", "currsize"]
+)
+
+
+class CompiledQueryCache:
+    """
+    Thread-safe LRU cache of compiled KQL queries, shared by the compilers of a dialect.
+    Queries compiled with literal values, e.g. Superset queries of virtual datasets, are not covered
+    by the SQLAlchemy statement cache and are compiled again on every request without it.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._queries: OrderedDict[Any, tuple[str, bool]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> tuple[str, bool] | None:
+        """Returns the compiled query and its approximate flag, or None."""
+        with self._lock:
+            compiled = self._queries.get(key)
+            if compiled is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._queries.move_to_end(key)
+            return compiled
+
+    def put(self, key, compiled: tuple[str, bool]) -> None:
+        with self._lock:
+            self._queries[key] = compiled
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.maxsize:
+                self._queries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._queries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CompiledCacheInfo:
+        with self._lock:
+            return CompiledCacheInfo(
+                self.hits, self.misses, self.maxsize, len(self._queries)
+            )
+
+
+class Approximate(HasCacheKey, ExecutableOption):
+    """
+    Statement option that trades accuracy for latency, e.g. `select(...).options(Approximate(sample=10000))`.
+
+    Args:
+        sample: number of rows randomly sampled after filtering, with the KQL sample operator.
+        sample_key: column used for hash sampling, rows with the same key are either all kept or all dropped.
+        sample_percent: percentage of the sample_key values kept by hash sampling.
+        dcount_accuracy: accuracy level of dcount from 0 (fastest) to 4 (most accurate).
+    """
+
+    _traverse_internals = [
+        ("sample", InternalTraversal.dp_plain_obj),
+        ("sample_key", InternalTraversal.dp_plain_obj),
+        ("sample_percent", InternalTraversal.dp_plain_obj),
+        ("dcount_accuracy", InternalTraversal.dp_plain_obj),
+    ]
+
+    def __init__(
+        self,
+        sample: int | None = None,
+        sample_key: str | None = None,
+        sample_percent: int | None = None,
+        dcount_accuracy: int | None = None,
+    ):
+        if (sample_key is None) != (sample_percent is None):
+            raise exc.ArgumentError(
+                "sample_key and sample_percent must be set together"
+            )
+        if dcount_accuracy is not None and dcount_accuracy not in range(5):
+            raise exc.ArgumentError("dcount_accuracy must be between 0 and 4")
+        self.sample = sample
+        self.sample_key = sample_key
+        self.sample_percent = sample_percent
+        self.dcount_accuracy = dcount_accuracy
+
+
+class MakeSeries(HasCacheKey, ExecutableOption):
+    """
+    Statement option that fills the missing time buckets of an aggregated time series on the cluster,
+    e.g. `select(...).group_by(timestamp, host).options(MakeSeries("__timestamp", step="1h"))`.
+    The summarize operator is replaced with make-series followed by mv-expand, so every bucket is returned.
+
+    Args:
+        time_column: name of the bucketed time column of GROUP BY, e.g. the label of date_trunc().
+        step: size of the buckets, a KQL timespan (e.g. "1h") or timedelta.
+        start: start of the series, a KQL expression (e.g. "ago(7d)") or datetime; the first bucket by default.
+        end: end of the series (exclusive), a KQL expression or datetime; the last bucket by default.
+        default: value of the aggregates in the missing buckets.
+    """
+
+    _traverse_internals = [
+        ("time_column", InternalTraversal.dp_plain_obj),
+        ("step", InternalTraversal.dp_plain_obj),
+        ("start", InternalTraversal.dp_plain_obj),
+        ("end", InternalTraversal.dp_plain_obj),
+        ("default", InternalTraversal.dp_plain_obj),
+    ]
+
+    def __init__(
+        self,
+        time_column: str,
+        step: str | datetime.timedelta,
+        start: str | datetime.datetime | None = None,
+        end: str | datetime.datetime | None = None,
+        default: Any = 0,
+    ):
+        self.time_column = time_column
+        self.step = step
+        self.start = start
+        self.end = end
+        self.default = default
+
+
 class KustoKqlCompiler(compiler.SQLCompiler):
     OPERATORS[operators.and_] = " and "
+    OPERATORS[operators.or_] = " or "
     delete_extra_from_clause = None
     update_from_clause = None
     visit_empty_set_expr = None
     visit_sequence = None
     sort_with_clause_parts = 2
+    # IN lists with at least this many values are hoisted into `let` bindings of dynamic arrays
+    in_list_let_threshold = 100
+
+    def __init__(self, *args, **kwargs):
+        self._in_list_bindings: list[str] = []
+        self._in_list_count = 0
+        # Let statements of subqueries and CTEs in the order they are compiled, as (name, body) pairs.
+        # Raw let statements of text queries have no name.
+        self._let_statements: list[tuple[str | None, str]] = []
+        self._let_references: Counter[str] = Counter()
+        self._select_depth = 0
+        # Set when the compiled query samples rows or uses estimated aggregates
+        self.approximate = False
+        # Renderers of bound values that are converted to KQL, by bind parameter key
+        self._bind_renderers: dict[str, Callable[[Any], str]] = {}
+        super().__init__(*args, **kwargs)
 
     def visit_select(
         self,
@@ -102,45 +429,38 @@ class KustoKqlCompiler(compiler.SQLCompiler):
         **kwargs,
     ):
         logger.debug("Incoming query: %s", select_stmt)
+        # Column names expected by the enclosing query, e.g. the labels of an ORM subquery
+        output_names = kwargs.pop("output_names", None)
+        cache_key = self._get_compiled_cache_key(select_stmt, **kwargs)
+        cached_query = self._get_cached_query(cache_key)
+        if cached_query is not None:
+            return cached_query
         compiled_query_lines = []
+        self._select_depth += 1
 
-        from_object = select_stmt.get_final_froms()[0]
-        if hasattr(from_object, "element"):
-            query = self._get_most_inner_element(from_object.element)
-            (main, lets) = self._extract_let_statements(query.text)
-            compiled_query_lines.extend(lets)
-            compiled_query_lines.append(
-                f"let {from_object.name} = ({self._convert_schema_in_statement(main)});"
-            )
-            compiled_query_lines.append(from_object.name)
-        elif hasattr(from_object, "name"):
-            if from_object.schema is not None:
-                unquoted_schema = from_object.schema.strip("\"'")
-                compiled_query_lines.append(f'database("{unquoted_schema}").')
-            unquoted_name = from_object.name.strip("\"'")
-            compiled_query_lines.append(f'["{unquoted_name}"]')
-        elif hasattr(from_object, "left"):
-            # This is a case of a join.
-            compiled_query_lines.append(
-                self._convert_schema_in_statement(from_object.left.fullname)
-            )
-        else:
-            compiled_query_lines.append(
-                self._convert_schema_in_statement(from_object.text)
-            )
-        kql_join = self._legacy_join(select_stmt, **kwargs)
-        compiled_query_lines.append(kql_join)
-        projections_parts_dict = self._get_projection_or_summarize(select_stmt)
+        compiled_query_lines.append(self._get_from_source(select_stmt, **kwargs))
+        approximate = self._get_option(select_stmt, Approximate) or Approximate()
+        compiled_query_lines.append(self._get_hash_sampling(approximate))
+        projections_parts_dict = self._get_projection_or_summarize(
+            select_stmt, **kwargs
+        )
+        projections_parts_dict["summarize"] = self._get_approximate_summarize(
+            projections_parts_dict["summarize"], approximate
+        )
 
         if select_stmt._whereclause is not None:
-            kwargs["literal_binds"] = True
-            where_clause = select_stmt._whereclause._compiler_dispatch(self, **kwargs)
-            if where_clause:
-                where_clause_reformatted = self._remove_table_from_where(where_clause)
-                converted_where_clause = self._sql_to_kql_where(
-                    where_clause_reformatted
-                )
-                compiled_query_lines.append(f"| where {converted_where_clause}")
+            where_kwargs = kwargs
+            if not self.dialect.query_parameters:
+                where_kwargs = {**kwargs, "literal_binds": True}
+            compiled_query_lines.extend(
+                self._get_where(select_stmt._whereclause, **where_kwargs)
+            )
+
+        if approximate.sample is not None:
+            self.approximate = True
+            compiled_query_lines.append(f"| sample {int(approximate.sample)}")
+
+        compiled_query_lines.extend(self._get_window_functions(select_stmt, **kwargs))
 
         if "extend" in projections_parts_dict:
             compiled_query_lines.append(projections_parts_dict.pop("extend"))
@@ -149,54 +469,703 @@ class KustoKqlCompiler(compiler.SQLCompiler):
             if statement_part:
                 compiled_query_lines.append(statement_part)
 
-        if select_stmt._limit_clause is not None:
-            kwargs["literal_execute"] = True
+        compiled_query_lines.append(self._get_sort_and_limit(select_stmt, **kwargs))
+        if output_names:
             compiled_query_lines.append(
-                f"| take {self.process(select_stmt._limit_clause, **kwargs)}"
+                self._get_output_rename(select_stmt, output_names)
             )
+        self._select_depth -= 1
+        compiled_query_lines[:0] = self._pop_let_statements()
         compiled_query_lines = list(filter(None, compiled_query_lines))
         compiled_query = "\n".join(compiled_query_lines)
         logger.warning("Compiled query: %s", compiled_query)
+        if cache_key is not None:
+            self.dialect.compiled_cache.put(
+                cache_key, (compiled_query, self.approximate)
+            )
         return compiled_query
 
+    def _get_from_source(self, select_stmt: selectable.Select, **kwargs) -> str:
+        """Builds the tabular source of the query: a table, a subquery, a join or a text query."""
+        from_object = select_stmt.get_final_froms()[0]
+        if hasattr(from_object, "element"):
+            return self._get_subquery_reference(from_object, **kwargs)
+        if hasattr(from_object, "name"):
+            return self._get_table_reference(from_object)
+        if hasattr(from_object, "left"):
+            # This is a case of a join.
+            return self._get_join_source(from_object, select_stmt, **kwargs)
+        return self._convert_schema_in_statement(from_object.text)
+
+    def _get_cached_query(self, cache_key) -> str | None:
+        """Returns the query compiled earlier and restores its approximate flag."""
+        if cache_key is None:
+            return None
+        cached = self.dialect.compiled_cache.get(cache_key)
+        if cached is None:
+            return None
+        compiled_query, self.approximate = cached
+        return compiled_query
+
+    def _get_compiled_cache_key(self, select_stmt: selectable.Select, **kwargs):
+        """
+        Returns the key of the compiled query cache: the structure of the statement, including the text
+        of textual elements, and the literal values. Only top-level selects compiled with literal values
+        are cached, as other compiled statements keep bound parameters besides the query string.
+        """
+        if (
+            self.dialect.compiled_cache is None
+            or select_stmt is not self.statement
+            or not kwargs.get("literal_binds")
+        ):
+            return None
+        statement_cache_key = select_stmt._generate_cache_key()
+        if statement_cache_key is None:
+            return None
+        values = tuple(
+            repr(bind.effective_value) for bind in statement_cache_key.bindparams
+        )
+        return statement_cache_key.key, values
+
+    def _get_where(self, where_clause: sql.ClauseElement, **kwargs) -> list[str]:
+        """
+        Builds the filters of the query. Conjunctions are split and ordered for extent pruning:
+        datetime range filters and equality filters of partition columns go to the first where operator,
+        followed by the other filters, with substring and regex matches last.
+        """
+        predicates = (
+            where_clause.clauses
+            if isinstance(where_clause, sql.elements.BooleanClauseList)
+            and where_clause.operator is operators.and_
+            else [where_clause]
+        )
+        pruning_predicates, cheap_predicates, expensive_predicates = [], [], []
+        for predicate in predicates:
+            compiled_predicate = predicate._compiler_dispatch(self, **kwargs)
+            if not compiled_predicate:
+                continue
+            kql_predicate = self._sql_to_kql_where(
+                self._remove_table_from_where(compiled_predicate),
+                self.dialect.like_policy,
+            )
+            if EXPENSIVE_PREDICATE_PATTERN.search(kql_predicate):
+                expensive_predicates.append(kql_predicate)
+            elif self._is_pruning_predicate(predicate, kql_predicate):
+                pruning_predicates.append(kql_predicate)
+            else:
+                cheap_predicates.append(kql_predicate)
+        where_lines = []
+        for group in (pruning_predicates, cheap_predicates + expensive_predicates):
+            if group:
+                where_lines.append(f"| where {' and '.join(group)}")
+        return where_lines
+
+    def _is_pruning_predicate(
+        self, predicate: sql.ClauseElement, kql_predicate: str
+    ) -> bool:
+        """Checks whether the predicate is a datetime range filter or an equality filter of a partition column."""
+        if not isinstance(predicate, sql.elements.BinaryExpression):
+            # Textual filters are recognized by the KQL datetime functions they compare to
+            return bool(DATETIME_RANGE_PATTERN.match(kql_predicate))
+        column = predicate.left
+        if predicate.operator in datetime_range_operators:
+            return isinstance(column.type, (sqltypes.DateTime, sqltypes.Date))
+        return (
+            predicate.operator in (operators.eq, operators.in_op)
+            and isinstance(column, sql.elements.ColumnClause)
+            and column.name in self.dialect.partition_columns
+        )
+
+    @staticmethod
+    def _get_option(select_stmt: selectable.Select, option_type: type) -> Any:
+        """Returns the statement option of the given type set with `select.options()`, or None."""
+        return next(
+            (
+                option
+                for option in select_stmt._with_options
+                if isinstance(option, option_type)
+            ),
+            None,
+        )
+
+    def _get_hash_sampling(self, approximate: Approximate) -> str:
+        """Builds the hash sampling filter, it is deterministic and runs before other filters."""
+        if approximate.sample_key is None:
+            return ""
+        self.approximate = True
+        return (
+            f"| where hash({self._escape_and_quote_columns(approximate.sample_key)}, 100) "
+            f"< {int(approximate.sample_percent)}"
+        )
+
+    def _get_approximate_summarize(
+        self, summarize_statement: str, approximate: Approximate
+    ) -> str:
+        """Flags the query as approximate when it uses estimated aggregates and sets the dcount accuracy."""
+        if not APPROXIMATE_AGGREGATE_PATTERN.search(summarize_statement):
+            return summarize_statement
+        self.approximate = True
+        if approximate.dcount_accuracy is None:
+            return summarize_statement
+        return DCOUNT_PATTERN.sub(
+            rf"dcount(\1, {approximate.dcount_accuracy})", summarize_statement
+        )
+
+    def _pop_let_statements(self) -> list[str]:
+        """
+        Returns the let statements collected while compiling the outermost select, nested selects return none,
+        as KQL only allows let statements at the beginning of the query.
+        Bindings referenced more than once are wrapped in materialize() to be computed only once.
+        """
+        if self._select_depth > 0:
+            return []
+        let_lines = self._in_list_bindings
+        for name, body in self._let_statements:
+            if name is None:
+                let_lines.append(body)
+            elif self._let_references[name] > 1:
+                let_lines.append(f"let {name} = materialize({body});")
+            else:
+                let_lines.append(f"let {name} = ({body});")
+        self._in_list_bindings = []
+        self._let_statements = []
+        self._let_references.clear()
+        return let_lines
+
+    def _get_output_rename(
+        self, select_stmt: selectable.Select, output_names: list[str]
+    ) -> str:
+        """Renames the projected columns to the names the enclosing query refers to."""
+        projected_names = []
+        for column in select_stmt.inner_columns:
+            if getattr(column, "name", None) == "*":
+                continue
+            column_name, column_alias = self._extract_column_name_and_alias(column)
+            projected_names.append(column_alias or column_name)
+        if len(projected_names) != len(output_names):
+            return ""
+        renames = [
+            f"{self._escape_and_quote_columns(output_name, True)} = "
+            f"{self._escape_and_quote_columns(projected_name, True)}"
+            for projected_name, output_name in zip(
+                projected_names, output_names, strict=True
+            )
+            if projected_name != output_name
+            and IDENTIFIER_PATTERN.match(projected_name)
+        ]
+        return f"| project-rename {', '.join(renames)}" if renames else ""
+
+    def _get_subquery_reference(self, from_object, **kwargs) -> str:
+        """
+        Compiles the subquery, CTE or text query into a let statement and returns the name of the binding.
+        A binding referenced again, e.g. a CTE used in several parts of a union, is compiled once.
+        """
+        if isinstance(from_object, selectable.Alias) and isinstance(
+            from_object.element, selectable.CTE
+        ):
+            # KQL has no table aliases, the alias of a CTE refers to the CTE binding
+            return self._get_subquery_reference(from_object.element, **kwargs)
+        name = from_object.name
+        if isinstance(name, sql.elements._truncated_label):
+            name = self._truncated_identifier("alias", name)
+        self._let_references[name] += 1
+        if self._let_references[name] > 1:
+            return name
+
+        inner_element = self._get_most_inner_element(from_object.element)
+        if isinstance(inner_element, sql.elements.TextClause):
+            main, lets = self._extract_let_statements(inner_element.text)
+            self._let_statements.extend((None, let) for let in lets)
+            body = self._convert_schema_in_statement(main)
+        elif isinstance(inner_element, selectable.TableClause):
+            body = self._get_table_reference(inner_element)
+        else:
+            body = from_object.element._compiler_dispatch(
+                self, output_names=list(from_object.c.keys()), **kwargs
+            )
+        self._let_statements.append((name, body))
+        return name
+
+    def visit_compound_select(
+        self, cs: selectable.CompoundSelect, asfrom=False, compound_index=None, **kwargs
+    ):
+        """
+        Compiles UNION ALL to the KQL union operator and UNION to union followed by distinct.
+        Let statements of the united queries are moved in front of the union.
+        """
+        if cs.keyword not in compound_operators_sql_to_kql:
+            raise exc.CompileError(f"{cs.keyword.name} is not supported in KQL dialect")
+        # KQL unites columns by name, so every part is renamed to the column names of the first one
+        output_names = kwargs.pop("output_names", None) or list(
+            cs.selected_columns.keys()
+        )
+        self._select_depth += 1
+        union_parts = []
+        for united_select in cs.selects:
+            select_stmt = (
+                united_select.element
+                if isinstance(united_select, selectable.SelectStatementGrouping)
+                else united_select
+            )
+            union_parts.append(
+                f"({select_stmt._compiler_dispatch(self, output_names=output_names, **kwargs)})"
+            )
+        self._select_depth -= 1
+
+        compiled_query_lines = [
+            *self._pop_let_statements(),
+            f"union {', '.join(union_parts)}",
+            compound_operators_sql_to_kql[cs.keyword],
+            self._get_sort_and_limit(cs, **kwargs),
+        ]
+        return "\n".join(filter(None, compiled_query_lines))
+
+    def _get_sort_and_limit(
+        self, select_stmt: selectable.GenerativeSelect, **kwargs
+    ) -> str:
+        """Builds the sorting and limiting part of the query."""
+        unwrapped_order_by = self._get_order_by(select_stmt._order_by_clauses)
+        kwargs["literal_execute"] = True
+        limit = (
+            self.process(select_stmt._limit_clause, **kwargs)
+            if select_stmt._limit_clause is not None
+            else None
+        )
+        if select_stmt._offset_clause is not None:
+            return self._get_offset_page(
+                unwrapped_order_by,
+                self.process(select_stmt._offset_clause, **kwargs),
+                limit,
+            )
+        if limit is not None:
+            if unwrapped_order_by:
+                # top runs as a bounded heap, which is cheaper than a full sort followed by take
+                return f"| top {limit} by {', '.join(unwrapped_order_by)}"
+            return f"| take {limit}"
+        if unwrapped_order_by:
+            return f"| order by {', '.join(unwrapped_order_by)}"
+        return ""
+
+    @staticmethod
+    def _get_offset_page(
+        unwrapped_order_by: list[str], offset: str, limit: str | None
+    ) -> str:
+        """
+        Builds the page of rows after the offset, rows are numbered after sorting,
+        so only the rows of the page are sent to the client.
+        """
+        page_lines = [
+            f"| order by {', '.join(unwrapped_order_by)}" if unwrapped_order_by else "",
+            f"| serialize {row_number_column} = row_number()",
+            f"| where {row_number_column} > {offset}",
+            f"| take {limit}" if limit is not None else "",
+            f"| project-away {row_number_column}",
+        ]
+        return "\n".join(filter(None, page_lines))
+
     def limit_clause(self, select, **kw):
         return ""
 
-    def _legacy_join(self, select_stmt: selectable.Select, **kwargs):
-        """Consumes arguments from join() or outerjoin(), places them into a
-        consistent format with which to form the actual JOIN constructs.
-        """
-        kql_join = ""
-        on_clause = ""
-        for right, on_columns, _left, flags in select_stmt._legacy_setup_joins:
-            join_type = "inner"
-            if flags["isouter"]:
-                if flags["full"]:
-                    join_type = "fullouter"
-                else:
-                    join_type = "leftouter"
-            if on_columns is not None:
-                left_clause_col, _ = self._extract_column_name_and_alias(
-                    on_columns.left
+    @staticmethod
+    def _get_table_reference(table) -> str:
+        """Builds KQL reference to the table, e.g. database("schema").["table"]."""
+        unquoted_name = table.name.strip("\"'")
+        schema = getattr(table, "schema", None)
+        if schema is None:
+            return f'["{unquoted_name}"]'
+        unquoted_schema = schema.strip("\"'")
+        return f'database("{unquoted_schema}").["{unquoted_name}"]'
+
+    def _get_join_source(
+        self,
+        join: selectable.Join,
+        select_stmt: selectable.Select,
+        projections: dict | None = None,
+        **kwargs,
+    ) -> str:
+        """
+        Builds the left-most table of the join followed by a join operator for every joined table.
+        Nested joins on the right side, e.g. a.join(b.join(c)), are compiled into parenthesized join expressions.
+        """
+        if projections is None:
+            projections = self._get_join_projections(join, select_stmt)
+            self._check_join_column_names(
+                join, self._get_join_column_references(join, select_stmt), projections
+            )
+        if isinstance(join.left, selectable.Join):
+            left = self._get_join_source(join.left, select_stmt, projections, **kwargs)
+        else:
+            left = self._get_join_side_reference(join.left, projections, **kwargs)
+
+        join_right = join.right
+        if isinstance(join_right, selectable.FromGrouping):
+            join_right = join_right.element
+        if isinstance(join_right, selectable.Join):
+            right = self._get_join_source(
+                join_right, select_stmt, projections, **kwargs
+            )
+        else:
+            right = self._get_join_side_reference(join_right, projections, **kwargs)
+
+        join_type = "inner"
+        if join.full:
+            join_type = "fullouter"
+        elif join.isouter:
+            join_type = "leftouter"
+        join_hint = self._get_join_hint(join_right, select_stmt._hints) or ""
+        if not join_hint and self._is_top_n_filter_join(join, select_stmt):
+            # The right side only filters the left one (e.g. Superset series limit), so the left semi join
+            # keeps the left columns only, and the small right side is broadcast to all nodes.
+            join_hint = "kind=leftsemi hint.strategy=broadcast"
+        # The hint may set the join flavor not available in SQL, e.g. kind=leftsemi or kind=rightanti
+        if "kind=" in join_hint:
+            join_kind = join_hint
+        else:
+            join_kind = f"kind={join_type} {join_hint}".strip()
+        on_clause = self._get_join_conditions(join)
+        return f"{left}\n| join {join_kind} ({right}) on {on_clause}"
+
+    @staticmethod
+    def _is_top_n_filter_join(
+        join: selectable.Join, select_stmt: selectable.Select
+    ) -> bool:
+        """
+        Checks whether the join is an inner join to a limited subquery, e.g. top N series by a measure,
+        grouped by exactly the join columns of the subquery, so that each row matches at most one row
+        of the subquery, and none of the selected, filtered, grouped or sorted columns come from that subquery.
+        """
+        right = join.right
+        if join.isouter or join.full or not isinstance(right, selectable.Subquery):
+            return False
+        subquery_select = right.element
+        if (
+            not isinstance(subquery_select, selectable.Select)
+            or subquery_select._limit_clause is None
+        ):
+            return False
+        outer_clauses = [
+            *select_stmt.inner_columns,
+            *select_stmt._group_by_clauses,
+            *select_stmt._order_by_clauses,
+        ]
+        if select_stmt._whereclause is not None:
+            outer_clauses.append(select_stmt._whereclause)
+        if any(
+            isinstance(element, sql.elements.ColumnClause) and element.table is right
+            for clause in outer_clauses
+            for element in visitors.iterate(clause)
+        ):
+            return False
+        join_columns = [
+            subquery_select.selected_columns.get(element.name)
+            for element in visitors.iterate(join.onclause)
+            if isinstance(element, sql.elements.ColumnClause) and element.table is right
+        ]
+        group_by = subquery_select._group_by_clauses
+        return (
+            bool(group_by)
+            and all(
+                any(KustoKqlCompiler._is_same_column(c, g) for g in group_by)
+                for c in join_columns
+            )
+            and all(
+                any(KustoKqlCompiler._is_same_column(c, g) for c in join_columns)
+                for g in group_by
+            )
+        )
+
+    @staticmethod
+    def _is_same_column(column, other) -> bool:
+        """Checks whether the columns are the same expression, either of them optionally labeled."""
+        if column is None or other is None:
+            return False
+        if isinstance(column, sql.elements.Label):
+            column = column.element
+        if isinstance(other, sql.elements.Label):
+            other = other.element
+        return column.compare(other)
+
+    def _get_join_side_reference(self, from_object, projections: dict, **kwargs) -> str:
+        if hasattr(from_object, "element"):
+            return self._get_subquery_reference(from_object, **kwargs)
+        table_reference = self._get_table_reference(from_object)
+        columns = projections.get(from_object)
+        if not columns:
+            return table_reference
+        # Only the referenced columns of wide tables are shuffled and kept in memory by the join
+        quoted_columns = ", ".join(map(self._escape_and_quote_columns, columns))
+        return f"{table_reference}\n| project {quoted_columns}"
+
+    def _get_join_projections(
+        self, join: selectable.Join, select_stmt: selectable.Select
+    ) -> dict[selectable.TableClause, list[str]]:
+        """
+        Returns the columns of every joined table that the query refers to, in the order of reference,
+        including the key column of hash sampling. Returns an empty dict when the query refers to columns
+        without a table, e.g. by text or SELECT *, or samples by a column of none of the tables.
+        """
+        projections: dict[selectable.TableClause, dict[str, None]] = {
+            leaf: {}
+            for leaf in self._get_join_leaves(join)
+            if isinstance(leaf, selectable.TableClause)
+        }
+        clauses = [
+            *select_stmt.inner_columns,
+            *select_stmt._group_by_clauses,
+            *select_stmt._order_by_clauses,
+            *self._get_join_onclauses(join),
+        ]
+        if select_stmt._whereclause is not None:
+            clauses.append(select_stmt._whereclause)
+        for clause in clauses:
+            for element in visitors.iterate(clause):
+                if isinstance(element, sql.elements.TextClause):
+                    return {}
+                if not isinstance(element, sql.elements.ColumnClause):
+                    continue
+                if element.is_literal or element.table is None:
+                    return {}
+                if element.table in projections:
+                    projections[element.table][element.name] = None
+        approximate = self._get_option(select_stmt, Approximate)
+        if approximate is not None and approximate.sample_key is not None:
+            # The hash sampling filter refers to the key column by name after the join
+            key_tables = [
+                table for table in projections if approximate.sample_key in table.c
+            ]
+            if not key_tables:
+                return {}
+            for table in key_tables:
+                projections[table][approximate.sample_key] = None
+        return {table: list(columns) for table, columns in projections.items()}
+
+    @staticmethod
+    def _get_join_column_references(
+        join: selectable.Join, select_stmt: selectable.Select
+    ) -> dict[str, set]:
+        """Returns the joined tables of every column name the query refers to outside of the join conditions."""
+        leaves = KustoKqlCompiler._get_join_leaves(join)
+        clauses = [
+            *select_stmt.inner_columns,
+            *select_stmt._group_by_clauses,
+            *select_stmt._order_by_clauses,
+        ]
+        if select_stmt._whereclause is not None:
+            clauses.append(select_stmt._whereclause)
+        references: dict[str, set] = {}
+        for clause in clauses:
+            for element in visitors.iterate(clause):
+                if (
+                    isinstance(element, sql.elements.ColumnClause)
+                    and element.table in leaves
+                ):
+                    references.setdefault(element.name, set()).add(element.table)
+        return references
+
+    def _check_join_column_names(
+        self, from_object, references: dict[str, set], projections: dict
+    ) -> None:
+        """
+        Raises CompileError when a column the query refers to can't be told apart after the join.
+        Columns are referenced by name only, and Kusto renames the right-side column of the join
+        when the left side has a column with the same name, e.g. Id to Id1.
+        Columns of both sides of an inner join on their equality have the same values.
+        """
+        if isinstance(from_object, selectable.FromGrouping):
+            from_object = from_object.element
+        if not isinstance(from_object, selectable.Join):
+            return
+        for name, tables in references.items():
+            if len(tables) > 1:
+                raise exc.CompileError(
+                    f"Column {name} of several joined tables is ambiguous in KQL dialect, "
+                    "label the columns in a subquery to give them unique names"
                 )
-                right_clause_col, _ = self._extract_column_name_and_alias(
-                    on_columns.right
+        self._check_join_column_names(from_object.left, references, projections)
+        self._check_join_column_names(from_object.right, references, projections)
+        left_leaves = self._get_join_leaves(from_object.left)
+        right_leaves = self._get_join_leaves(from_object.right)
+        # Columns of a side without projection are all kept by the join
+        left_names = {
+            name
+            for leaf in left_leaves
+            for name in (projections.get(leaf) or leaf.c.keys())
+        }
+        equal_names = set()
+        if not from_object.isouter and not from_object.full:
+            onclause = from_object.onclause
+            conditions = (
+                onclause.clauses
+                if isinstance(onclause, sql.elements.BooleanClauseList)
+                else [onclause]
+            )
+            for condition in conditions:
+                if (
+                    isinstance(condition, sql.elements.BinaryExpression)
+                    and condition.operator is operators.eq
+                    and isinstance(condition.left, sql.elements.ColumnClause)
+                    and isinstance(condition.right, sql.elements.ColumnClause)
+                    and condition.left.name == condition.right.name
+                ):
+                    equal_names.add(condition.left.name)
+        for name, tables in references.items():
+            if tables & right_leaves and name in left_names - equal_names:
+                raise exc.CompileError(
+                    f"Column {name} of the right side of the join is renamed by Kusto as the left side "
+                    "has a column with the same name, label it in a subquery to give it a unique name"
                 )
-                on_clause = (
-                    f"on $left.{self._escape_and_quote_columns(left_clause_col)} "
-                    f"== $right.{self._escape_and_quote_columns(right_clause_col)}"
+
+    @staticmethod
+    def _get_join_onclauses(from_object) -> list[sql.ClauseElement]:
+        """Returns the ON clauses of the join and of the nested joins."""
+        if isinstance(from_object, selectable.FromGrouping):
+            return KustoKqlCompiler._get_join_onclauses(from_object.element)
+        if not isinstance(from_object, selectable.Join):
+            return []
+        return [
+            from_object.onclause,
+            *KustoKqlCompiler._get_join_onclauses(from_object.left),
+            *KustoKqlCompiler._get_join_onclauses(from_object.right),
+        ]
+
+    def _get_join_hint(self, right, hints: dict) -> str | None:
+        """
+        Returns the join hints set with `select.with_hint(right_table, "hint.strategy=broadcast")`.
+        Hints of nested joins are looked up by the first table of the join.
+        """
+        while True:
+            if isinstance(right, selectable.FromGrouping):
+                right = right.element
+            elif isinstance(right, selectable.Join):
+                right = right.left
+            else:
+                break
+        return hints.get((right, self.dialect.name)) or hints.get((right, "*"))
+
+    @staticmethod
+    def _get_join_leaves(from_object) -> set:
+        """Returns the tables, aliases and subqueries joined in the from object without looking into subqueries."""
+        if isinstance(from_object, selectable.FromGrouping):
+            return KustoKqlCompiler._get_join_leaves(from_object.element)
+        if isinstance(from_object, selectable.Join):
+            return KustoKqlCompiler._get_join_leaves(
+                from_object.left
+            ) | KustoKqlCompiler._get_join_leaves(from_object.right)
+        return {from_object}
+
+    def _get_join_conditions(self, join: selectable.Join) -> str:
+        """Converts the ON clause of the join to $left/$right equality conditions joined with `and`."""
+        right_tables = self._get_join_leaves(join.right)
+        if isinstance(join.onclause, sql.elements.BooleanClauseList):
+            if join.onclause.operator is not operators.and_:
+                raise exc.CompileError("Only AND of conditions is supported in join")
+            conditions = list(join.onclause.clauses)
+        else:
+            conditions = [join.onclause]
+
+        kql_conditions = []
+        for condition in conditions:
+            if (
+                not isinstance(condition, sql.elements.BinaryExpression)
+                or condition.operator is not operators.eq
+                or not isinstance(condition.left, sql.elements.ColumnClause)
+                or not isinstance(condition.right, sql.elements.ColumnClause)
+            ):
+                raise exc.CompileError(
+                    f"Only equality of columns is supported in join condition: {condition}"
                 )
-            kql_join = f"| join kind={join_type} ({self._escape_and_quote_columns(right.name)}) {on_clause}"
-        return kql_join
+            left_column, right_column = condition.left, condition.right
+            if left_column.table in right_tables:
+                left_column, right_column = right_column, left_column
+            kql_conditions.append(
+                f"$left.{self._escape_and_quote_columns(left_column.name)} "
+                f"== $right.{self._escape_and_quote_columns(right_column.name)}"
+            )
+        return " and ".join(kql_conditions)
+
+    # LIKE is translated to has/contains/startswith/endswith depending on the pattern,
+    # so the pattern is always rendered as literal, even in query parameters mode.
+    def visit_like_op_binary(self, binary, operator, **kw):
+        kw["literal_binds"] = True
+        return super().visit_like_op_binary(binary, operator, **kw)
+
+    def visit_not_like_op_binary(self, binary, operator, **kw):
+        kw["literal_binds"] = True
+        return super().visit_not_like_op_binary(binary, operator, **kw)
+
+    def visit_ilike_op_binary(self, binary, operator, **kw):
+        kw["literal_binds"] = True
+        return super().visit_ilike_op_binary(binary, operator, **kw)
+
+    def visit_not_ilike_op_binary(self, binary, operator, **kw):
+        kw["literal_binds"] = True
+        return super().visit_not_ilike_op_binary(binary, operator, **kw)
+
+    def visit_in_op_binary(self, binary, operator, **kw):
+        if not kw.get("literal_binds"):
+            return self._generate_generic_binary(binary, OPERATORS[operator], **kw)
+        values_name = self._hoist_in_list(binary.right)
+        if values_name is None:
+            return self._generate_generic_binary(binary, OPERATORS[operator], **kw)
+        return f"{binary.left._compiler_dispatch(self, **kw)} IN ({values_name})"
+
+    def visit_not_in_op_binary(self, binary, operator, **kw):
+        if not kw.get("literal_binds"):
+            return super().visit_not_in_op_binary(binary, operator, **kw)
+        values_name = self._hoist_in_list(binary.right)
+        if values_name is None:
+            return super().visit_not_in_op_binary(binary, operator, **kw)
+        return f"({binary.left._compiler_dispatch(self, **kw)} NOT IN ({values_name}))"
+
+    def _hoist_in_list(self, values_clause) -> str | None:
+        """
+        Moves the values of a large IN list into a `let` binding of a dynamic array and returns its name.
+        Large lists are rendered once, and the where clause stays short for the regex based conversion.
+        """
+        if (
+            not isinstance(values_clause, sql.elements.BindParameter)
+            or not values_clause.expanding
+        ):
+            return None
+        values = values_clause.effective_value
+        if not values or len(values) < self.in_list_let_threshold:
+            return None
+        rendered_values = [self._render_dynamic_value(value) for value in values]
+        if None in rendered_values:
+            return None
+        # Bindings of all selects of the statement are hoisted to the top, so names must be unique across them
+        values_name = f"_in_list{self._in_list_count}"
+        self._in_list_count += 1
+        self._in_list_bindings.append(
+            f"let {values_name} = dynamic([{','.join(rendered_values)}]);"  # type: ignore[arg-type]
+        )
+        return values_name
+
+    @staticmethod
+    def _render_dynamic_value(value) -> str | None:
+        """Renders the value as an element of a dynamic literal, returns None for unsupported types."""
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, int):
+            return str(value)
+        if isinstance(value, float) and math.isfinite(value):
+            return repr(value)
+        if isinstance(value, str):
+            return json.dumps(value, ensure_ascii=False)
+        return None
 
     def visit_join(self, join, asfrom=True, from_linter=None, **kwargs):
         return ""
 
-    def _get_projection_or_summarize(self, select: selectable.Select) -> dict[str, str]:
+    def _get_projection_or_summarize(
+        self, select: selectable.Select, **kwargs
+    ) -> dict[str, str]:
         """Builds the ending part of the query either project or summarize."""
+        row_count_projection = self._get_row_count_projection(select)
+        if row_count_projection is not None:
+            return row_count_projection
         columns = select.inner_columns
         group_by_cols = select._group_by_clauses
-        order_by_cols = select._order_by_clauses
         summarize_statement = ""
         extend_statement = ""
         project_statement = ""
@@ -212,20 +1181,34 @@ class KustoKqlCompiler(compiler.SQLCompiler):
         #                |
         #                N---> Add to projection
         if columns is not None:
-            summarize_columns = set()
+            # Ordered like the selected columns, so the compiled query is stable
+            summarize_columns: dict[str, None] = {}
+            # KQL types of the aggregates, make-series returns them as arrays
+            aggregate_types: dict[str, str] = {}
             extend_columns = set()
             projection_columns = []
-            for column in [c for c in columns if c.name != "*"]:
-                column_name, column_alias = self._extract_column_name_and_alias(column)
+            for column in [c for c in columns if getattr(c, "name", None) != "*"]:
+                if self._is_window_column(column):
+                    # Window functions are computed by the extend operator of _get_window_functions
+                    projection_columns.append(
+                        self._escape_and_quote_columns(
+                            self._get_window_column_name(column), True
+                        )
+                    )
+                    continue
+                column_name, column_alias = self._extract_column_name_and_alias(
+                    column, **kwargs
+                )
                 column_alias = self._escape_and_quote_columns(column_alias, True)
                 # Do we have a group by clause ?
                 # Do we have aggregate columns ?
                 kql_agg = self._extract_maybe_agg_column_parts(column_name)
                 if kql_agg:
                     has_aggregates = True
-                    summarize_columns.add(
+                    summarize_columns[
                         self._build_column_projection(kql_agg, column_alias)
-                    )
+                    ] = None
+                    aggregate_types[column_alias] = self._get_kql_type(column)
                 # No group by clause
                 # Do the columns have aliases ?
                 # Add additional and to handle case where : SELECT column_name as column_name
@@ -242,36 +1225,320 @@ class KustoKqlCompiler(compiler.SQLCompiler):
                         self._escape_and_quote_columns(column_name)
                     )
             # group by columns
-            by_columns = self._group_by(group_by_cols)
-            if has_aggregates or bool(
+            by_columns = self._group_by(group_by_cols, **kwargs)
+            make_series = self._get_option(select, MakeSeries)
+            if make_series is not None and has_aggregates:
+                summarize_statement = self._get_make_series(
+                    make_series, summarize_columns, aggregate_types, by_columns
+                )
+            elif has_aggregates or bool(
                 by_columns
             ):  # Summarize can happen with or without aggregate being created
-                summarize_statement = f"| summarize {', '.join(summarize_columns)} "
+                summarize_hint = self._get_summarize_hint(select, by_columns)
+                summarize_statement = (
+                    f"| summarize {summarize_hint}{', '.join(summarize_columns)} "
+                )
                 if by_columns:
                     summarize_statement = (
                         f"{summarize_statement} by {', '.join(by_columns)}"
                     )
             if extend_columns:
                 extend_statement = f"| extend {', '.join(sorted(extend_columns))}"
-            project_statement = (
-                f"| project {', '.join(projection_columns)}"
-                if projection_columns
-                else ""
+            project_statement = self._get_project_statement(
+                select, projection_columns, by_columns, bool(summarize_statement)
             )
-        unwrapped_order_by = self._get_order_by(order_by_cols)
-        sort_statement = (
-            f"| order by {', '.join(unwrapped_order_by)}" if unwrapped_order_by else ""
-        )
         return {
             "extend": extend_statement,
             "summarize": summarize_statement,
             "project": project_statement,
-            "sort": sort_statement,
         }
 
+    @staticmethod
+    def _get_project_statement(
+        select: selectable.Select,
+        projection_columns: list[str],
+        by_columns: set[str],
+        is_summarized: bool,
+    ) -> str:
+        """
+        Builds the projection of the selected columns, the distinct operator of SELECT DISTINCT projects them as well.
+        Summarized rows are unique when every GROUP BY column is selected, otherwise they are deduplicated.
+        """
+        if not projection_columns:
+            return ""
+        columns = ", ".join(projection_columns)
+        if not select._distinct:
+            return f"| project {columns}"
+        if not is_summarized:
+            return f"| distinct {columns}"
+        if by_columns <= set(projection_columns):
+            return f"| project {columns}"
+        return f"| project {columns}\n| distinct *"
+
+    def _get_make_series(
+        self,
+        make_series: MakeSeries,
+        summarize_columns: dict[str, None],
+        aggregate_types: dict[str, str],
+        by_columns: set[str],
+    ) -> str:
+        """
+        Builds make-series of the aggregates with the time axis of the MakeSeries option,
+        followed by mv-expand that returns a row per bucket like summarize does.
+        """
+        time_column = self._escape_and_quote_columns(make_series.time_column)
+        if time_column not in by_columns:
+            raise exc.CompileError(
+                f"Time column {make_series.time_column} of make-series must be in GROUP BY"
+            )
+        if None in aggregate_types:
+            raise exc.CompileError("Aggregates of make-series must be labeled")
+        default = self._render_make_series_value(make_series.default)
+        aggregates = ", ".join(f"{c} default = {default}" for c in summarize_columns)
+        axis = [f"on {time_column}"]
+        for keyword, value in (
+            ("from", make_series.start),
+            ("to", make_series.end),
+            ("step", make_series.step),
+        ):
+            if value is not None:
+                axis.append(
+                    f"{keyword} {value if isinstance(value, str) else self._render_make_series_value(value)}"
+                )
+        group_by = sorted(by_columns - {time_column})
+        # Array elements are dynamic unless converted to the type of the aggregate
+        expanded_columns = [f"{time_column} to typeof(datetime)"] + [
+            f"{alias} to typeof({kql_type})" if kql_type != "dynamic" else alias
+            for alias, kql_type in aggregate_types.items()
+        ]
+        return "\n".join(
+            [
+                f"| make-series {aggregates} {' '.join(axis)}"
+                + (f" by {', '.join(group_by)}" if group_by else ""),
+                f"| mv-expand {', '.join(expanded_columns)}",
+            ]
+        )
+
+    def _render_make_series_value(self, value) -> str:
+        """Renders the literal of a make-series argument, e.g. a datetime or the default value."""
+        if value is None:
+            return "dynamic(null)"
+        return self.render_literal_value(value, sql.literal(value).type)
+
+    def _get_summarize_hint(
+        self, select: selectable.Select, by_columns: set[str]
+    ) -> str:
+        """
+        Builds the shuffle hints of the summarize operator followed by a space, or an empty string.
+        Hints set with `select.with_statement_hint("hint.strategy=shuffle", dialect_name="kustokql")` take
+        precedence, otherwise the shuffle strategy is chosen by the dialect `shuffle_*` settings.
+        """
+        statement_hints = [
+            hint_text
+            for dialect_name, hint_text in select._statement_hints
+            if dialect_name in ("*", self.dialect.name)
+        ]
+        if statement_hints:
+            return f"{' '.join(statement_hints)} "
+        if not by_columns:
+            return ""
+        shuffle_keys = sorted(
+            by_columns
+            & {self._escape_and_quote_columns(key) for key in self.dialect.shuffle_keys}
+        )
+        if shuffle_keys:
+            return f"hint.shufflekey = {shuffle_keys[0]} "
+        if 0 < self.dialect.shuffle_min_group_by_columns <= len(by_columns):
+            return "hint.strategy = shuffle "
+        return ""
+
+    @staticmethod
+    def _is_window_column(column) -> bool:
+        element = column.element if isinstance(column, sql.elements.Label) else column
+        return isinstance(element, sql.elements.Over)
+
+    @staticmethod
+    def _get_window_column_name(column) -> str:
+        """Returns the label of the window function column, or the function name when it has none."""
+        if isinstance(column, sql.elements.Label) and not isinstance(
+            column.name, sql.elements._anonymous_label
+        ):
+            return column.name
+        over = column.element if isinstance(column, sql.elements.Label) else column
+        return over.element.name
+
+    def _get_window_functions(self, select: selectable.Select, **kwargs) -> list[str]:
+        """
+        Builds sort and extend operators computing window functions, e.g. row_number() OVER (ORDER BY x).
+        Rows are sorted by the partition columns followed by the window order, and the partition restarts
+        whenever a partition column differs from the previous row. Consecutive windows with the same
+        partition and order share a single sort.
+        """
+        window_lines: list[str] = []
+        extend_columns: list[str] = []
+        current_sort: list[str] | None = None
+        for column in select.inner_columns:
+            if not self._is_window_column(column):
+                continue
+            if select._group_by_clauses:
+                raise exc.CompileError(
+                    "Window functions can't be combined with GROUP BY in KQL dialect"
+                )
+            over = column.element if isinstance(column, sql.elements.Label) else column
+            partition_by = [
+                self._get_window_argument(c, **kwargs)
+                for c in self._get_clauses(over.partition_by)
+            ]
+            order_by = [
+                self._get_window_order(c, **kwargs)
+                for c in self._get_clauses(over.order_by)
+            ]
+            sort = [f"{c} asc" for c in partition_by] + order_by
+            if sort != current_sort:
+                if extend_columns:
+                    window_lines.append(f"| extend {', '.join(extend_columns)}")
+                    extend_columns = []
+                # Window functions require serialized rows, the sort operator serializes them
+                window_lines.append(
+                    f"| sort by {', '.join(sort)}" if sort else "| serialize"
+                )
+                current_sort = sort
+            window_function = self._window_function_to_kql(
+                over, partition_by, order_by, **kwargs
+            )
+            column_name = self._get_window_column_name(column)
+            extend_columns.append(
+                f"{self._escape_and_quote_columns(column_name, True)} = {window_function}"
+            )
+        if extend_columns:
+            window_lines.append(f"| extend {', '.join(extend_columns)}")
+        return window_lines
+
+    def _window_function_to_kql(
+        self,
+        over: sql.elements.Over,
+        partition_by: list[str],
+        order_by: list[str],
+        **kwargs,
+    ) -> str:
+        """Converts the window function to the KQL function of serialized rows."""
+        function = over.element
+        function_name = function.name.lower()
+        arguments = [
+            self._get_window_argument(argument, **kwargs)
+            for argument in function.clauses
+        ]
+        # The partition restarts when any of its columns differs from the previous row
+        restart = " or ".join(f"{c} != prev({c})" for c in partition_by)
+        if function_name == "row_number":
+            kql_arguments = ["1", restart] if restart else []
+            kql_function = "row_number"
+        elif function_name in window_rank_functions:
+            if len(order_by) != 1:
+                raise exc.CompileError(
+                    f"{function.name} expects a single ORDER BY column"
+                )
+            kql_arguments = [order_by[0].rsplit(" ", 1)[0], restart]
+            kql_function = window_rank_functions[function_name]
+        elif function_name == "sum" and order_by and len(arguments) == 1:
+            kql_arguments = [arguments[0], restart]
+            kql_function = "row_cumsum"
+        elif function_name in window_offset_functions and arguments:
+            return self._offset_window_function_to_kql(
+                window_offset_functions[function_name],
+                arguments,
+                partition_by,
+                function.clauses.clauses[0],
+            )
+        else:
+            raise exc.CompileError(
+                f"Window function {function.name} is not supported in KQL dialect"
+            )
+        return f"{kql_function}({', '.join(filter(None, kql_arguments))})"
+
+    def _offset_window_function_to_kql(
+        self,
+        kql_function: str,
+        arguments: list[str],
+        partition_by: list[str],
+        column: sql.ColumnElement,
+    ) -> str:
+        """
+        Converts lag(column, offset, default) and lead() to prev() and next().
+        Values of other partitions are replaced with the default, or a null of the column type.
+        """
+        offset = arguments[1] if len(arguments) > 1 else "1"
+        default = arguments[2] if len(arguments) > 2 else None  # noqa: PLR2004
+        value = f"{kql_function}({', '.join(filter(None, [arguments[0], offset, default]))})"
+        if not partition_by:
+            return value
+        same_partition = " and ".join(
+            f"{kql_function}({c}, {offset}) == {c}" for c in partition_by
+        )
+        return (
+            f"iff({same_partition}, {value}, {default or self._get_typed_null(column)})"
+        )
+
+    @staticmethod
+    def _get_typed_null(expression) -> str:
+        """Returns the null of the expression type, as both values of iff() must have the same type."""
+        kql_type = KustoKqlCompiler._get_kql_type(expression)
+        # KQL strings can't be null, empty string is used instead
+        return '""' if kql_type == "string" else f"{kql_type}(null)"
+
+    @staticmethod
+    def _get_kql_type(expression) -> str:
+        for sql_type, kql_type in kql_types:
+            if isinstance(expression.type, sql_type):
+                return kql_type
+        return "dynamic"
+
+    def _get_window_argument(self, argument, **kwargs) -> str:
+        if isinstance(argument, sql.elements.ColumnClause) and not argument.is_literal:
+            return self._escape_and_quote_columns(argument.name)
+        # Values are rendered when the statement is executed, as compiled statements are cached regardless of them
+        kwargs["literal_execute"] = True
+        return argument._compiler_dispatch(self, **kwargs)
+
+    def _get_window_order(self, order_by, **kwargs) -> str:
+        direction = "asc"
+        if isinstance(order_by, sql.elements.UnaryExpression):
+            if order_by.modifier is operators.desc_op:
+                direction = "desc"
+            order_by = order_by.element
+        return f"{self._get_window_argument(order_by, **kwargs)} {direction}"
+
+    @staticmethod
+    def _get_clauses(clause_list) -> list:
+        return list(clause_list.clauses) if clause_list is not None else []
+
+    def _get_row_count_projection(
+        self, select: selectable.Select
+    ) -> dict[str, str] | None:
+        """
+        Builds the `count` operator for selects that only count rows, e.g. SELECT count(*) AS total FROM t.
+        The operator is cheaper than `summarize count()` followed by a projection of the alias.
+        """
+        columns = [c for c in select.inner_columns if getattr(c, "name", None) != "*"]
+        if (
+            len(columns) != 1
+            or select._group_by_clauses
+            or self._is_window_column(columns[0])
+        ):
+            return None
+        column_name, column_alias = self._extract_column_name_and_alias(columns[0])
+        if self._extract_maybe_agg_column_parts(column_name) != "count()":
+            return None
+        rename_statement = (
+            f"| project-rename {self._escape_and_quote_columns(column_alias, True)} = Count"
+            if column_alias
+            else ""
+        )
+        return {"summarize": "| count", "project": rename_statement}
+
     @staticmethod
     def _extract_maybe_agg_column_parts(column_name) -> str | None:
-        match_agg_cols = re.match(AGGREGATE_PATTERN, column_name, re.IGNORECASE)
+        match_agg_cols = AGGREGATE_PATTERN.match(column_name)
         if match_agg_cols and match_agg_cols.groups():
             # Check if the aggregate function is count_distinct. This is case from superset
             # where we can use count(distinct or count_distinct)
@@ -321,10 +1588,16 @@ class KustoKqlCompiler(compiler.SQLCompiler):
                 )
         return unwrapped_order_by
 
-    def _group_by(self, group_by_cols):
+    def _group_by(self, group_by_cols, **kwargs):
         by_columns = set()
-        for column in group_by_cols:
-            column_name, column_alias = self._extract_column_name_and_alias(column)
+        for group_by_col in group_by_cols:
+            column = group_by_col
+            # Functions in GROUP BY come wrapped in a clause list, e.g. date_trunc('day', Timestamp)
+            if isinstance(column, sql.elements.ClauseList) and len(column.clauses) == 1:
+                column = column.clauses[0]
+            column_name, column_alias = self._extract_column_name_and_alias(
+                column, **kwargs
+            )
             if column_alias:
                 by_columns.add(self._escape_and_quote_columns(column_alias))
             else:
@@ -332,28 +1605,30 @@ class KustoKqlCompiler(compiler.SQLCompiler):
         return by_columns
 
     @staticmethod
+    @functools.lru_cache(maxsize=QUOTING_CACHE_SIZE)
     def _convert_quoted_columns(kql_expression) -> str:
-        # Regex to find function calls with quoted column names
-        pattern = r'(\w+)\(\s*"([^"]+)"'
-
-        # Replace with the modified format
+        # Replace function calls with quoted column names with the modified format
         def replacer(match):
             function_name = match.group(1)
             column_name = match.group(2)
             return f'{function_name}(["{column_name}"]'  # Wrap column in brackets
 
         # Apply transformation
-        modified_expression = re.sub(pattern, replacer, kql_expression)
+        modified_expression = QUOTED_FUNCTION_ARGUMENT_PATTERN.sub(
+            replacer, kql_expression
+        )
 
         return modified_expression
 
     @staticmethod
+    @functools.lru_cache(maxsize=QUOTING_CACHE_SIZE)
     def _escape_and_quote_columns(name: str | None, is_alias=False) -> str:
         if name is None:
             return ""
         if (
             KustoKqlCompiler._is_kql_function(name)
             or KustoKqlCompiler._is_number_literal(name)
+            or POST_COMPILE_PATTERN.match(name)
         ) and not is_alias:
             return name
         if name.startswith('"') and name.endswith('"'):
@@ -380,7 +1655,7 @@ class KustoKqlCompiler(compiler.SQLCompiler):
         return f'["{name}"]'
 
     @staticmethod
-    def _sql_to_kql_where(where_clause: str) -> str:
+    def _sql_to_kql_where(where_clause: str, like_policy: str = LIKE_POLICY_HAS) -> str:
         where_clause = where_clause.strip().replace("\n", "")
 
         # Handle 'IS NULL' and 'IS NOT NULL' -> KQL equivalents
@@ -436,7 +1711,9 @@ class KustoKqlCompiler(compiler.SQLCompiler):
             )
             where_clause = re.sub(
                 like_regexp.format(like="NOT LIKE", pre="%+", post="%+"),
-                r"\1!has_cs \2\3\4\3\5",
+                KustoKqlCompiler._substring_replacer(
+                    like_policy, case_sensitive=True, negate=True
+                ),
                 where_clause,
                 flags=re.IGNORECASE,
             )
@@ -454,14 +1731,18 @@ class KustoKqlCompiler(compiler.SQLCompiler):
             )
             where_clause = re.sub(
                 like_regexp.format(like="NOT ILIKE", pre="%+", post="%+"),
-                r"\1!has \2\3\4\3\5",
+                KustoKqlCompiler._substring_replacer(
+                    like_policy, case_sensitive=False, negate=True
+                ),
                 where_clause,
                 flags=re.IGNORECASE,
             )
         elif re.search(r"I?LIKE", where_clause, re.IGNORECASE):
             where_clause = re.sub(
                 like_regexp.format(like="LIKE", pre="%+", post="%+"),
-                r"\1has_cs \2\3\4\3\5",
+                KustoKqlCompiler._substring_replacer(
+                    like_policy, case_sensitive=True, negate=False
+                ),
                 where_clause,
                 flags=re.IGNORECASE,
             )
@@ -479,7 +1760,9 @@ class KustoKqlCompiler(compiler.SQLCompiler):
             )
             where_clause = re.sub(
                 like_regexp.format(like="ILIKE", pre="%+", post="%+"),
-                r"\1has \2\3\4\3\5",
+                KustoKqlCompiler._substring_replacer(
+                    like_policy, case_sensitive=False, negate=False
+                ),
                 where_clause,
                 flags=re.IGNORECASE,
             )
@@ -510,13 +1793,13 @@ class KustoKqlCompiler(compiler.SQLCompiler):
         # Handle BETWEEN operator (if needed)
 
         where_clause = re.sub(
-            r"(\w+|\[\"[A-Za-z0-9_]+\"\]) (BETWEEN|between) (\d) (AND|and) (\d)",
+            r"(\w+|\[\"[A-Za-z0-9_]+\"\]) (BETWEEN|between) (-?[\d.]+) (AND|and) (-?[\d.]+)",
             r"\1 between (\3..\5)",
             where_clause,
             flags=re.IGNORECASE,
         )
         where_clause = re.sub(
-            r"(\w+) (BETWEEN|between) (\d) (AND|and) (\d)",
+            r"(\w+) (BETWEEN|between) (-?[\d.]+) (AND|and) (-?[\d.]+)",
             r"\1 between (\3..\5)",
             where_clause,
             flags=re.IGNORECASE,
@@ -535,20 +1818,46 @@ class KustoKqlCompiler(compiler.SQLCompiler):
         where_clause = re.sub(r"\s+OR\s+", r" or ", where_clause, flags=re.IGNORECASE)
         return where_clause
 
+    @staticmethod
+    def _substring_replacer(
+        like_policy: str, case_sensitive: bool, negate: bool
+    ) -> Callable[[re.Match], str]:
+        """Builds the regex replacement for LIKE '%value%' according to the LIKE policy."""
+
+        def replacer(match):
+            space, function, quote, value, closing = match.groups()
+            operator = KustoKqlCompiler._substring_operator(value, like_policy)
+            # Case-insensitive match of a value without letters finds the same rows as the faster case-sensitive one
+            if case_sensitive or (
+                like_policy == LIKE_POLICY_AUTO and value.lower() == value.upper()
+            ):
+                operator += "_cs"
+            if negate:
+                operator = "!" + operator
+            return f"{space}{operator} {function or ''}{quote}{value}{quote}{closing or ''}"
+
+        return replacer
+
+    @staticmethod
+    def _substring_operator(value: str, like_policy: str) -> str:
+        """Chooses between term (has) and substring (contains) match for the value."""
+        if like_policy == LIKE_POLICY_HAS:
+            return "has"
+        if like_policy == LIKE_POLICY_TERM and TERM_PATTERN.match(value):
+            return "has"
+        return "contains"
+
     @staticmethod
     def _remove_table_from_where(where_clause: str) -> str:
-        regex = r'(?:\["?)(\w+)(["?]\])?\.'
-        return re.sub(regex, "", where_clause)
+        return TABLE_PREFIX_PATTERN.sub("", where_clause)
 
     @staticmethod
     def _is_kql_function(name: str) -> bool:
-        pattern = r"^[a-zA-Z_][a-zA-Z0-9_]*\s*\("
-        return bool(re.match(pattern, name))
+        return bool(KQL_FUNCTION_PATTERN.match(name))
 
     @staticmethod
     def _is_number_literal(s: str) -> bool:
-        pattern = r"^[0-9]+$"
-        return bool(re.match(pattern, s))
+        return bool(NUMBER_LITERAL_PATTERN.match(s))
 
     def _get_most_inner_element(self, clause):
         """Finds the most nested element in clause."""
@@ -569,16 +1878,288 @@ class KustoKqlCompiler(compiler.SQLCompiler):
         lets = [row + ";" for row in rows if row.startswith("let")]
         return main, lets
 
-    @staticmethod
-    def _extract_column_name_and_alias(column: Column) -> tuple[str, str | None]:
+    def _extract_column_name_and_alias(
+        self, column: Column, **kwargs
+    ) -> tuple[str, str | None]:
+        kql_function = self._extract_function_name_and_alias(column, **kwargs)
+        if kql_function is not None:
+            return kql_function
         if hasattr(column, "element"):
+            element = column.element
+            if (
+                isinstance(element, sql.elements.ColumnClause)
+                and not element.is_literal
+            ):
+                # Labeled table column, e.g. table.c.Id.label("Key"), is referenced without the table name
+                return element.name, KustoKqlCompiler._convert_quoted_columns(
+                    column.name
+                )
+            # Columns are rendered without table names, e.g. median("Duration") rather than median(logs."Duration")
+            element_text = str(element.compile(compile_kwargs={"include_table": False}))
             return KustoKqlCompiler._convert_quoted_columns(
-                str(column.element)
+                element_text
             ), KustoKqlCompiler._convert_quoted_columns(column.name)
         if hasattr(column, "name"):
             return KustoKqlCompiler._convert_quoted_columns(str(column.name)), None
         return KustoKqlCompiler._convert_quoted_columns(str(column)), None
 
+    def _extract_function_name_and_alias(
+        self,
+        column: Column,
+        **kwargs,
+    ) -> tuple[str, str | None] | None:
+        """
+        Converts SQL function column, optionally labeled, that has a KQL counterpart with different arguments
+        to the KQL expression and the alias, e.g. date_trunc() or percentile_cont() WITHIN GROUP.
+        Scalar functions, CAST, CASE and EXTRACT are compiled to KQL during the tree walk.
+        """
+        element = column.element if isinstance(column, sql.elements.Label) else column
+        kql_function = None
+        if self._is_kql_scalar_expression(element):
+            # Values are rendered when the statement is executed, as compiled statements are cached regardless of them
+            kql_function = element._compiler_dispatch(
+                self, **{**kwargs, "include_table": False, "literal_execute": True}
+            )
+        elif isinstance(element, sql.functions.Function):
+            kql_function = self._date_trunc_to_kql(element, **kwargs)
+        elif isinstance(element, sql.elements.WithinGroup):
+            kql_function = self._percentile_to_kql(element, **kwargs)
+        if kql_function is None:
+            return None
+        if element is column or isinstance(column.name, sql.elements._anonymous_label):
+            return kql_function, None
+        return kql_function, KustoKqlCompiler._convert_quoted_columns(column.name)
+
+    def _is_kql_scalar_expression(self, element) -> bool:
+        if isinstance(
+            element, (sql.elements.Cast, sql.elements.Case, sql.elements.Extract)
+        ):
+            return True
+        if not isinstance(element, sql.functions.Function):
+            return False
+        name = element.name.lower()
+        return name in functions_sql_to_kql or hasattr(self, f"visit_{name}_func")
+
+    def _percentile_to_kql(
+        self, within_group: sql.elements.WithinGroup, **kwargs
+    ) -> str | None:
+        """
+        Converts percentile_cont(0.9) WITHIN GROUP (ORDER BY column) and percentile_disc() to percentile(column, 90).
+        Kusto estimates percentiles with T-Digest, so the result is approximate.
+        """
+        function = within_group.element
+        if function.name.lower() not in ("percentile_cont", "percentile_disc"):
+            return None
+        arguments = list(function.clauses)
+        order_by = (
+            list(within_group.order_by.clauses)
+            if within_group.order_by is not None
+            else []
+        )
+        if len(arguments) != 1 or len(order_by) != 1:
+            raise exc.CompileError(
+                f"{function.name} expects a fraction and a single ORDER BY column"
+            )
+        fraction = arguments[0]
+        column = order_by[0]
+        descending = False
+        if isinstance(column, sql.elements.UnaryExpression):
+            descending = column.modifier is operators.desc_op
+            column = column.element
+
+        def render(fraction_value) -> str:
+            fraction_value = float(fraction_value)
+            if descending:
+                fraction_value = 1 - fraction_value
+            return f"{fraction_value * 100:g}"
+
+        if isinstance(fraction, sql.elements.BindParameter):
+            percentage = self._render_bind_value(fraction, render, **kwargs)
+        else:
+            percentage = render(getattr(fraction, "value", fraction))
+        return (
+            f"percentile({KustoKqlCompiler._escape_and_quote_columns(column.name)}, "
+            f"{percentage})"
+        )
+
+    def _date_trunc_to_kql(
+        self, function: sql.functions.Function, **kwargs
+    ) -> str | None:
+        """
+        Converts date_trunc('<unit>', column) to the KQL expression of the matching time grain,
+        e.g. date_trunc('hour', Timestamp) to bin(["Timestamp"], 1h). Returns None for other functions.
+        """
+        if function.name.lower() != "date_trunc":
+            return None
+        arguments = list(function.clauses)
+        if len(arguments) != 2:  # noqa: PLR2004
+            raise exc.CompileError("date_trunc expects a unit and a column")
+        unit, column = arguments
+        if isinstance(column, sql.elements.ColumnClause) and not column.is_literal:
+            column_name = KustoKqlCompiler._escape_and_quote_columns(column.name)
+        else:
+            column_name = str(column)
+
+        def render(unit_value) -> str:
+            unit_name = str(unit_value).strip("'").lower()
+            if unit_name not in date_trunc_time_grains:
+                raise exc.CompileError(f"Unsupported date_trunc unit {unit_name}")
+            return time_grain_expressions[date_trunc_time_grains[unit_name]].format(
+                col=column_name
+            )
+
+        kql_expression = render(getattr(unit, "effective_value", unit))
+        if isinstance(unit, sql.elements.BindParameter):
+            return self._render_bind_value(unit, render, **kwargs)
+        return kql_expression
+
+    def _render_bind_value(
+        self,
+        bind: sql.elements.BindParameter,
+        renderer: Callable[[Any], str],
+        **kwargs,
+    ) -> str:
+        """
+        Renders the KQL of a bound value, e.g. the time grain of a date_trunc() unit. The value is rendered
+        when the statement is executed, as SQLAlchemy caches compiled statements regardless of bound values.
+        """
+        self._bind_renderers[bind.key] = renderer
+        return bind._compiler_dispatch(self, **{**kwargs, "literal_execute": True})
+
+    def render_literal_bindparam(self, bindparam, render_literal_value=NO_ARG, **kw):
+        renderer = self._bind_renderers.get(bindparam.key)
+        if renderer is None:
+            return super().render_literal_bindparam(
+                bindparam, render_literal_value=render_literal_value, **kw
+            )
+        if render_literal_value is NO_ARG:
+            return renderer(bindparam.effective_value)
+        return renderer(render_literal_value)
+
+    def visit_function(self, func, add_to_result_map=None, **kwargs):
+        date_trunc = self._date_trunc_to_kql(func, **kwargs)
+        if date_trunc is not None:
+            return date_trunc
+        kql_function = functions_sql_to_kql.get(func.name.lower())
+        if kql_function is not None:
+            if add_to_result_map is not None:
+                add_to_result_map(func.name, func.name, (), func.type)
+            return f"{kql_function}{self.function_argspec(func, **kwargs)}"
+        return super().visit_function(func, add_to_result_map, **kwargs)
+
+    def visit_substring_func(self, func, **kwargs):
+        """Converts substring(text, start, length), KQL substring() starts at 0 rather than 1."""
+        arguments = list(func.clauses)
+        if len(arguments) not in (2, 3):
+            raise exc.CompileError("substring expects a text, a start and a length")
+        start = arguments[1]
+        if isinstance(start, sql.elements.BindParameter) and isinstance(
+            start.effective_value, int
+        ):
+            kql_start = self._render_bind_value(
+                start, lambda value: str(value - 1), **kwargs
+            )
+        else:
+            kql_start = f"{start._compiler_dispatch(self, **kwargs)} - 1"
+        kql_arguments = [arguments[0]._compiler_dispatch(self, **kwargs), kql_start]
+        kql_arguments.extend(
+            a._compiler_dispatch(self, **kwargs) for a in arguments[2:]
+        )
+        return f"substring({', '.join(kql_arguments)})"
+
+    def visit_date_add_func(self, func, **kwargs):
+        """Converts date_add('<unit>', amount, column) to datetime_add('<unit>', amount, column)."""
+        arguments = list(func.clauses)
+        if len(arguments) != 3:  # noqa: PLR2004
+            raise exc.CompileError(
+                f"{func.name} expects a unit, an amount and a column"
+            )
+        unit, amount, column = arguments
+
+        def render(unit_value) -> str:
+            unit_name = str(unit_value).strip("'").lower()
+            if unit_name not in datetime_periods:
+                raise exc.CompileError(f"Unsupported {func.name} unit {unit_name}")
+            return f"'{unit_name}'"
+
+        kql_unit = render(getattr(unit, "effective_value", unit))
+        if isinstance(unit, sql.elements.BindParameter):
+            kql_unit = self._render_bind_value(unit, render, **kwargs)
+        return (
+            f"datetime_add({kql_unit}, {amount._compiler_dispatch(self, **kwargs)}, "
+            f"{column._compiler_dispatch(self, **kwargs)})"
+        )
+
+    visit_dateadd_func = visit_date_add_func
+
+    def visit_extract(self, extract, **kwargs):
+        field = extract.field.lower()
+        expression = extract.expr._compiler_dispatch(self, **kwargs)
+        if field in extract_fields_sql_to_kql:
+            return extract_fields_sql_to_kql[field].format(expr=expression)
+        if field not in datetime_periods:
+            raise exc.CompileError(f"Unsupported extract field {extract.field}")
+        return f"datetime_part('{field}', {expression})"
+
+    def visit_cast(self, cast, **kwargs):
+        return f"to{self._get_kql_type(cast)}({cast.clause._compiler_dispatch(self, **kwargs)})"
+
+    def visit_case(self, clause, **kwargs):
+        """Converts CASE with a single WHEN to iff() and CASE with several WHEN to case()."""
+        value = (
+            clause.value._compiler_dispatch(self, **kwargs)
+            if clause.value is not None
+            else None
+        )
+        kql_arguments = []
+        for condition, result in clause.whens:
+            kql_condition = condition._compiler_dispatch(self, **kwargs)
+            kql_arguments.append(
+                f"{value} == {kql_condition}" if value is not None else kql_condition
+            )
+            kql_arguments.append(result._compiler_dispatch(self, **kwargs))
+        # Both iff() and case() require the default value, of the same type as the results
+        kql_arguments.append(
+            clause.else_._compiler_dispatch(self, **kwargs)
+            if clause.else_ is not None
+            else self._get_typed_null(clause)
+        )
+        kql_function = "iff" if len(clause.whens) == 1 else "case"
+        return f"{kql_function}({', '.join(kql_arguments)})"
+
+    def render_literal_value(self, value, type_):
+        if isinstance(value, datetime.timedelta):
+            return format_timespan(value)
+        if isinstance(value, datetime.date):
+            return format_datetime(value)
+        if isinstance(value, str):
+            # KQL escapes quotes in string literals with a backslash rather than doubling them,
+            # and line breaks are escaped as filters are joined into a single line
+            value = value.translate(kql_string_escapes)
+            if self.preparer._double_percents:
+                value = value.replace("%", "%%")
+            return f"'{value}'"
+        return super().render_literal_value(value, type_)
+
+    def visit_eq_binary(self, binary, operator, **kwargs):
+        return self._generate_generic_binary(binary, " == ", **kwargs)
+
+    def visit_between_op_binary(self, binary, operator, **kwargs):
+        return self._get_between(binary, "between", **kwargs)
+
+    def visit_not_between_op_binary(self, binary, operator, **kwargs):
+        return self._get_between(binary, "!between", **kwargs)
+
+    def _get_between(self, binary, kql_operator: str, **kwargs) -> str:
+        """Converts BETWEEN lower AND upper to the KQL between (lower..upper) of inclusive bounds."""
+        if binary.modifiers.get("symmetric"):
+            raise exc.CompileError("BETWEEN SYMMETRIC is not supported in KQL dialect")
+        lower, upper = binary.right.clauses
+        return (
+            f"{binary.left._compiler_dispatch(self, **kwargs)} {kql_operator} "
+            f"({lower._compiler_dispatch(self, **kwargs)}..{upper._compiler_dispatch(self, **kwargs)})"
+        )
+
     @staticmethod
     def _build_column_projection(
         column_name: str, column_alias: str | None = None, is_extend: bool = False
@@ -608,8 +2189,7 @@ class KustoKqlCompiler(compiler.SQLCompiler):
             - ["schema"].["table"]        -> database("schema").["table"]
             - ["table"]                   -> ["table"]
         """
-        pattern = r"^\[?([a-zA-Z0-9]+\b|\"[a-zA-Z0-9 \-_.]+\")?\]?\.?\[?([a-zA-Z0-9]+\b|\"[a-zA-Z0-9 \-_.]+\")\]?"
-        match = re.search(pattern, query)
+        match = SCHEMA_TABLE_PATTERN.search(query)
         if not match:
             return query
 
@@ -655,6 +2235,8 @@ class KustoKqlCompiler(compiler.SQLCompiler):
             return return_value
 
         aggregation_function = sql_agg.lower().split("(")[0]
+        if aggregation_function == "median":
+            return f"percentile({column_name_escaped}, 50)"
 
         # Other summarize operators have to be looked up
         sql_to_kql_aggregate_function = aggregates_sql_to_kql.get(aggregation_function)
@@ -667,8 +2249,91 @@ class KustoKqlCompiler(compiler.SQLCompiler):
         return return_value
 
 
+class KustoKqlExecutionContext(default.DefaultExecutionContext):
+    @property
+    def approximate(self) -> bool:
+        """True when the results come from sampled rows or estimated aggregates, see `Approximate`."""
+        return bool(getattr(self.compiled, "approximate", False))
+
+
 class KustoKqlHttpsDialect(KustoBaseDialect):
     name = "kustokql"
     statement_compiler = KustoKqlCompiler
+    execution_ctx_cls = KustoKqlExecutionContext
     preparer = KustoKqlIdentifierPreparer
     supports_statement_cache = True
+
+    # create_engine() passes only the arguments of the signature that are not keyword-only
+    def __init__(  # noqa: PLR0917
+        self,
+        like_policy: str = LIKE_POLICY_HAS,
+        query_parameters: bool = False,
+        shuffle_keys: list[str] | None = None,
+        shuffle_min_group_by_columns: int = 0,
+        partition_columns: list[str] | None = None,
+        compiled_cache_size: int = 500,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.like_policy = self._parse_like_policy(like_policy)
+        self.query_parameters = query_parameters
+        # High-cardinality columns, grouping by any of them shuffles summarize by that column
+        self.shuffle_keys = shuffle_keys or []
+        # Grouping by at least this many columns shuffles summarize, 0 disables the heuristic
+        self.shuffle_min_group_by_columns = shuffle_min_group_by_columns
+        # Columns of the data partitioning policy, equality filters on them go first with time filters
+        self.partition_columns = partition_columns or []
+        # Compiled queries of statements with literal values, 0 disables the cache
+        self.compiled_cache = (
+            CompiledQueryCache(compiled_cache_size) if compiled_cache_size > 0 else None
+        )
+
+    def create_connect_args(self, url: URL) -> tuple[list[Any], dict[str, Any]]:
+        args, kwargs = super().create_connect_args(url)
+        # LIKE policy configures the compiler, not the DBAPI connection
+        if "like_policy" in kwargs:
+            self.like_policy = self._parse_like_policy(kwargs.pop("like_policy"))
+        # Summarize shuffle settings configure the compiler, not the DBAPI connection
+        if "shuffle_keys" in kwargs:
+            self.shuffle_keys = self._parse_columns(kwargs.pop("shuffle_keys"))
+        if "shuffle_min_group_by_columns" in kwargs:
+            self.shuffle_min_group_by_columns = int(
+                kwargs.pop("shuffle_min_group_by_columns")
+            )
+        # Predicate ordering configures the compiler, not the DBAPI connection
+        if "partition_columns" in kwargs:
+            self.partition_columns = self._parse_columns(
+                kwargs.pop("partition_columns")
+            )
+        if "compiled_cache_size" in kwargs:
+            compiled_cache_size = int(kwargs.pop("compiled_cache_size"))
+            self.compiled_cache = (
+                CompiledQueryCache(compiled_cache_size)
+                if compiled_cache_size > 0
+                else None
+            )
+        # Query parameters mode is shared by the compiler and the DBAPI cursor
+        self.query_parameters = kwargs.get("query_parameters", self.query_parameters)
+        if self.query_parameters:
+            kwargs["query_parameters"] = True
+        # Queries compiled before the URL settings were applied are compiled differently now
+        if self.compiled_cache is not None:
+            self.compiled_cache.clear()
+        return args, kwargs
+
+    def compiled_cache_info(self) -> CompiledCacheInfo | None:
+        """Returns hits, misses, maximum and current size of the compiled query cache, or None when disabled."""
+        return self.compiled_cache.info() if self.compiled_cache is not None else None
+
+    @staticmethod
+    def _parse_columns(columns: str) -> list[str]:
+        """Parses comma-separated column names of URL parameters."""
+        return [column.strip() for column in columns.split(",") if column.strip()]
+
+    @staticmethod
+    def _parse_like_policy(like_policy: str) -> str:
+        if like_policy not in like_policies:
+            raise exc.ArgumentError(
+                f"Unknown like_policy {like_policy}, expected one of {sorted(like_policies)}"
+            )
+        return like_policy
@@ -0,0 +1,108 @@
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any
+
+from azure.core.credentials import AccessToken
+
+from sqlalchemy_kusto import errors
+
+logger = logging.getLogger(__name__)
+
+# Tokens expiring sooner than this are treated as missing so that a query never starts with a stale token.
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+
+class TokenCache(ABC):
+    """Storage for AAD access tokens that can be shared between processes."""
+
+    @abstractmethod
+    def load(self, key: str) -> AccessToken | None:
+        """Returns the cached token for the key or None."""
+
+    @abstractmethod
+    def save(self, key: str, token: AccessToken) -> None:
+        """Stores the token under the key."""
+
+
+class FileTokenCache(TokenCache):
+    """
+    File-backed token cache shared by all processes on the same host.
+
+    The file is encrypted with the platform data protection API (DPAPI on Windows, Keychain on macOS,
+    libsecret on Linux). When encryption is not available the cache either raises an error or, if
+    `allow_unencrypted` is set, falls back to a plain file readable only by the current user.
+    """
+
+    def __init__(self, path: str, allow_unencrypted: bool = False):
+        import msal_extensions  # noqa: PLC0415
+
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock_path = str(self.path) + ".lockfile"
+        try:
+            self._persistence = msal_extensions.build_encrypted_persistence(
+                str(self.path)
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            if not allow_unencrypted:
+                raise errors.InterfaceError(
+                    "Token cache encryption is not available on this host. "
+                    "Set token_cache_allow_unencrypted=true to store the cache as a plain file."
+                ) from error
+            logger.debug("Falling back to unencrypted token cache: %s", error)
+            self._persistence = msal_extensions.FilePersistence(str(self.path))
+            self.path.touch(mode=0o600, exist_ok=True)
+
+    def load(self, key: str) -> AccessToken | None:
+        entry = self._read().get(key)
+        if entry is None:
+            return None
+        return AccessToken(entry["token"], entry["expires_on"])
+
+    def save(self, key: str, token: AccessToken) -> None:
+        import msal_extensions  # noqa: PLC0415
+
+        with msal_extensions.CrossPlatLock(self._lock_path):
+            entries = self._read()
+            now = time.time()
+            entries = {k: v for k, v in entries.items() if v["expires_on"] > now}
+            entries[key] = {"token": token.token, "expires_on": token.expires_on}
+            self._persistence.save(json.dumps(entries))
+
+    def _read(self) -> dict[str, Any]:
+        try:
+            content = self._persistence.load()
+        except OSError:
+            # Missing or unreadable cache, the token will be requested again
+            return {}
+        if not content:
+            return {}
+        try:
+            return json.loads(content)
+        except ValueError:
+            return {}
+
+
+class CachedTokenCredential:
+    """Azure token credential that consults a `TokenCache` before asking AAD for a token."""
+
+    def __init__(self, credential: Any, cache: TokenCache, identity: str):
+        self.credential = credential
+        self.cache = cache
+        self.identity = identity
+
+    def get_token(self, *scopes: str, **kwargs) -> AccessToken:
+        key = f"{self.identity}|{' '.join(scopes)}"
+        token = self.cache.load(key)
+        if (
+            token is not None
+            and token.expires_on - TOKEN_REFRESH_MARGIN_SECONDS > time.time()
+        ):
+            return token
+
+        token = self.credential.get_token(*scopes, **kwargs)
+        self.cache.save(key, token)
+        return token
@@ -85,6 +85,23 @@ def test_count_by(temp_table_name):
         assert {(x[0]) for x in result.fetchall()} == {9}
 
 
+def test_top_by(temp_table_name):
+    table = Table(
+        temp_table_name,
+        metadata,
+        Column("Id", sqlalchemy.types.Integer),
+        Column("Text", String),
+    )
+    query = session.query(table.c.Id).order_by(text("Id DESC")).limit(3)
+    query_compiled = str(
+        query.statement.compile(kql_engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    assert "| top 3 by" in query_compiled
+    with kql_engine.connect() as connection:
+        result = connection.execute(text(query_compiled))
+        assert [x[0] for x in result.fetchall()] == [9, 8, 7]
+
+
 def test_join_by(temp_table_name):
     value_to_filter = 8
     table1 = Table(
@@ -0,0 +1,219 @@
+import datetime
+import socket
+import subprocess
+import sys
+import uuid
+from decimal import Decimal
+
+import pytest
+import requests
+from azure.kusto.data import ClientRequestProperties
+from azure.kusto.data.exceptions import KustoServiceError
+from sqlalchemy import create_engine
+
+from sqlalchemy_kusto import errors
+from sqlalchemy_kusto.dbapi import Cursor
+
+HTTP_POOL_MAXSIZE = 256
+
+IMPORT_PROBE = """
+import sys
+import time
+
+import sqlalchemy
+
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = sorted(name for name in sys.modules if name.startswith(("azure.kusto", "azure.identity")))
+print(elapsed)
+print(",".join(loaded))
+"""
+
+
+def _import_in_fresh_interpreter(module: str) -> tuple[float, list[str]]:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE.format(module=module)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.splitlines()
+    elapsed = float(output[0])
+    loaded = output[1].split(",") if len(output) > 1 and output[1] else []
+    return elapsed, loaded
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "sqlalchemy_kusto",
+        "sqlalchemy_kusto.dialect_kql",
+        "sqlalchemy_kusto.dialect_sql",
+    ],
+)
+def test_import_does_not_load_azure_sdk(module: str):
+    _, loaded = _import_in_fresh_interpreter(module)
+    assert loaded == []
+
+
+def test_import_time_benchmark():
+    # SQLAlchemy itself is preloaded by the probe, so this measures only the cost added by the package.
+    # Timings are only reported, as they depend on the load of the machine
+    package_time, loaded = _import_in_fresh_interpreter("sqlalchemy_kusto")
+    sdk_time, _ = _import_in_fresh_interpreter("azure.kusto.data")
+    print(  # noqa: T201
+        f"import sqlalchemy_kusto: {package_time * 1000:.1f}ms, "
+        f"import azure.kusto.data: {sdk_time * 1000:.1f}ms"
+    )
+    assert loaded == []
+
+
+def test_connect_loads_azure_sdk():
+    from sqlalchemy_kusto import dbapi  # noqa: PLC0415
+
+    connection = dbapi.connect("https://localhost", "testdb")
+    assert "azure.kusto.data" in sys.modules
+    assert connection.kusto_client is not None
+    cursor = connection.cursor()
+    assert cursor.properties is not None
+    connection.close()
+
+
+def test_connect_http_settings():
+    from sqlalchemy_kusto import dbapi  # noqa: PLC0415
+
+    connection = dbapi.connect(
+        "https://localhost",
+        "testdb",
+        http_pool_maxsize=HTTP_POOL_MAXSIZE,
+        http_keep_alive=False,
+        proxy="http://proxy:3128",
+    )
+    session = connection.kusto_client._session
+    adapter = session.get_adapter("https://localhost")
+    assert adapter._pool_maxsize == HTTP_POOL_MAXSIZE
+    assert all(option[1] != socket.SO_KEEPALIVE for option in adapter.socket_options)
+    assert session.proxies == {
+        "http": "http://proxy:3128",
+        "https": "http://proxy:3128",
+    }
+
+
+class LegacyKustoClient:
+    """Kusto client of azure-kusto-data releases without the socket options adapter."""
+
+    def __init__(self, kcsb):
+        self._session = requests.Session()
+
+
+def test_connect_http_settings_unsupported_client(monkeypatch, caplog):
+    from sqlalchemy_kusto import dbapi  # noqa: PLC0415
+
+    monkeypatch.setattr("azure.kusto.data.KustoClient", LegacyKustoClient)
+    connection = dbapi.connect(
+        "https://localhost", "testdb", http_pool_maxsize=HTTP_POOL_MAXSIZE
+    )
+    adapter = connection.kusto_client._session.get_adapter("https://localhost")
+    assert adapter._pool_maxsize != HTTP_POOL_MAXSIZE
+    assert "not supported by the installed azure-kusto-data" in caplog.text
+
+
+def test_http_settings_url_parameters():
+    engine = create_engine(
+        "kustokql+https://localhost/testdb"
+        f"?http_pool_maxsize={HTTP_POOL_MAXSIZE}&http_keep_alive=false&proxy=http://proxy:3128"
+    )
+    _, kwargs = engine.dialect.create_connect_args(engine.url)
+    assert kwargs["http_pool_maxsize"] == HTTP_POOL_MAXSIZE
+    assert kwargs["http_keep_alive"] is False
+    assert kwargs["proxy"] == "http://proxy:3128"
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("O'Brien", ("string", "O'Brien")),
+        (True, ("bool", "true")),
+        (42, ("long", "42")),
+        (1.5, ("real", "1.5")),
+        (Decimal("1.10"), ("decimal", "decimal(1.10)")),
+        (
+            datetime.datetime(2024, 1, 2, 3, 4, 5),
+            ("datetime", "datetime(2024-01-02T03:04:05)"),
+        ),
+        (
+            datetime.datetime(
+                2024,
+                1,
+                2,
+                3,
+                4,
+                5,
+                tzinfo=datetime.timezone(datetime.timedelta(hours=2)),
+            ),
+            ("datetime", "datetime(2024-01-02T01:04:05)"),
+        ),
+        (datetime.date(2024, 1, 2), ("datetime", "datetime(2024-01-02)")),
+        (
+            datetime.timedelta(days=1, hours=2, seconds=3, microseconds=4),
+            ("timespan", "time(1.02:00:03.0000040)"),
+        ),
+        (
+            datetime.timedelta(minutes=-90),
+            ("timespan", "time(-0.01:30:00.0000000)"),
+        ),
+        (
+            uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            ("guid", "guid(12345678-1234-5678-1234-567812345678)"),
+        ),
+        (["a", 1], ("dynamic", 'dynamic(["a", 1])')),
+        (None, ("dynamic", "dynamic(null)")),
+    ],
+)
+def test_to_query_parameter(value, expected):
+    assert Cursor._to_query_parameter(value) == expected
+
+
+def test_declare_query_parameters():
+    query, values = Cursor._declare_query_parameters(
+        "T | where A == %(a)s and B > %(b)s and C == %(a)s | extend P = 100%%",
+        {"a": "x", "b": 1, "unused": 2},
+    )
+    assert query == (
+        "declare query_parameters(_p0:string, _p1:long);\n"
+        "T | where A == _p0 and B > _p1 and C == _p0 | extend P = 100%"
+    )
+    assert values == {"_p0": "x", "_p1": "1"}
+
+
+class FakeKustoClient:
+    def __init__(self):
+        self.requests = []
+
+    def execute(self, database, query, properties):
+        self.requests.append((query, properties))
+        raise KustoServiceError("stop")
+
+
+@pytest.mark.parametrize(
+    ("query_parameters", "expected_query", "expected_parameters"),
+    [
+        (False, "T | where A == 'x'", {}),
+        (
+            True,
+            "declare query_parameters(_p0:string);\nT | where A == _p0",
+            {"_p0": "x"},
+        ),
+    ],
+)
+def test_cursor_query_parameters(query_parameters, expected_query, expected_parameters):
+    client = FakeKustoClient()
+    properties = ClientRequestProperties()
+    cursor = Cursor(client, "testdb", properties, query_parameters)
+    with pytest.raises(errors.DatabaseError):
+        cursor.execute("T | where A == %(a)s", {"a": "x"})
+    query, request_properties = client.requests[0]
+    assert query == expected_query
+    assert request_properties._parameters == expected_parameters
+    # Connection properties are shared by cursors and must not keep the parameters
+    assert properties._parameters == {}
@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import create_engine
+
+from sqlalchemy_kusto.dialect_base import WARMUP_QUERY, KustoBaseDialect
+
+
+class FakeRawConnection:
+    def __init__(self, queries: list[str]):
+        self.queries = queries
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def execute(self, query):
+        self.queries.append(query)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeEngine:
+    def __init__(self):
+        self.queries: list[str] = []
+        self.connections: list[FakeRawConnection] = []
+
+    def raw_connection(self):
+        connection = FakeRawConnection(self.queries)
+        self.connections.append(connection)
+        return connection
+
+
+@pytest.mark.parametrize(
+    ("query", "expected_connections"),
+    [
+        ("", 0),
+        ("?warmup=false", 0),
+        ("?warmup=true", 1),
+        ("?warmup=true&warmup_connections=4", 4),
+        ("?warmup_connections=4", 0),
+    ],
+)
+def test_warmup_url_parameters(query: str, expected_connections: int, monkeypatch):
+    monkeypatch.setattr(KustoBaseDialect, "_warm_up", staticmethod(lambda *_: None))
+    engine = create_engine(f"kustokql+https://localhost/testdb{query}")
+    _, kwargs = engine.dialect.create_connect_args(engine.url)
+    assert "warmup" not in kwargs
+    assert "warmup_connections" not in kwargs
+    assert engine.dialect.warmup_connections == expected_connections
+
+
+def test_warm_up_opens_pooled_connections():
+    engine = FakeEngine()
+    KustoBaseDialect._warm_up(engine, 3)
+    assert engine.queries == [WARMUP_QUERY] * 3
+    assert all(connection.closed for connection in engine.connections)
@@ -1,3 +1,7 @@
+import datetime
+import sys
+import time
+
 import pytest
 import sqlalchemy as sa
 from sqlalchemy import (
@@ -13,12 +17,23 @@ from sqlalchemy import (
     select,
     text,
 )
+from sqlalchemy.orm import Session
 from sqlalchemy.sql.selectable import TextAsFrom
 
-from sqlalchemy_kusto.dialect_kql import KustoKqlCompiler
+from sqlalchemy_kusto.dialect_kql import (
+    Approximate,
+    KustoKqlCompiler,
+    KustoKqlExecutionContext,
+    MakeSeries,
+    time_grain_expressions,
+)
 
 engine = create_engine("kustokql+https://localhost/testdb")
 
+# Durations of the CASE conditions executed on a single engine
+SLOW_DURATION = 100
+SLOWER_DURATION = 200
+
 
 def test_compiler_with_projection():
     statement_str = "logs | take 10"
@@ -128,6 +143,22 @@ def test_select_from_text():
         pytest.param(
             Column("Field2", Integer).between(2, 4), """["Field2"] between (2..4)"""
         ),
+        pytest.param(
+            Column("Field2", Integer).between(1, 20), """["Field2"] between (1..20)"""
+        ),
+        pytest.param(
+            ~Column("Field2", Integer).between(1, 20),
+            """["Field2"] !between (1..20)""",
+        ),
+        pytest.param(
+            Column("Field2", sa.DateTime).between(
+                datetime.datetime(2024, 1, 1), datetime.datetime(2024, 2, 1)
+            ),
+            """["Field2"] between """
+            """(datetime(2024-01-01T00:00:00)..datetime(2024-02-01T00:00:00))""",
+        ),
+        pytest.param(text("Field2 BETWEEN 1 AND 20"), "Field2 between (1..20)"),
+        pytest.param(text("Field2 BETWEEN -1.5 AND 20"), "Field2 between (-1.5..20)"),
         pytest.param(Column("Field2", Integer).is_(None), """isnull(["Field2"])"""),
         pytest.param(
             Column("Field2", Integer).isnot(None), """isnotnull(["Field2"])"""
@@ -159,6 +190,239 @@ def test_where_predicates(f, expected):
     assert query_compiled == query_expected
 
 
+@pytest.mark.parametrize(
+    ("like_policy", "f", "expected"),
+    [
+        pytest.param("has", text("Field1 LIKE '%abc%'"), "Field1 has_cs 'abc'"),
+        pytest.param("has", text("Field1 ILIKE '%a b%'"), "Field1 has 'a b'"),
+        pytest.param(
+            "contains", text("Field1 LIKE '%abc%'"), "Field1 contains_cs 'abc'"
+        ),
+        pytest.param(
+            "contains", text("Field1 NOT ILIKE '%abc%'"), "Field1 !contains 'abc'"
+        ),
+        pytest.param(
+            "contains", text("Field1 LIKE 'abc%'"), "Field1 startswith_cs 'abc'"
+        ),
+        pytest.param("term", text("Field1 LIKE '%abc%'"), "Field1 has_cs 'abc'"),
+        pytest.param("term", text("Field1 NOT ILIKE '%Abc1%'"), "Field1 !has 'Abc1'"),
+        pytest.param("term", text("Field1 LIKE '%ab%'"), "Field1 contains_cs 'ab'"),
+        pytest.param("term", text("Field1 ILIKE '%a-bc%'"), "Field1 contains 'a-bc'"),
+        pytest.param(
+            "term", text("Field1 NOT LIKE '%a bc%'"), "Field1 !contains_cs 'a bc'"
+        ),
+        # Term-shaped values may be part of longer terms, e.g. 'error' of 'myerrors'
+        pytest.param(
+            "auto", text("Field1 LIKE '%error%'"), "Field1 contains_cs 'error'"
+        ),
+        pytest.param(
+            "auto", text("Field1 NOT ILIKE '%Abc1%'"), "Field1 !contains 'Abc1'"
+        ),
+        pytest.param(
+            "auto", text("Field1 ILIKE '%404-1%'"), "Field1 contains_cs '404-1'"
+        ),
+        pytest.param("auto", text("Field1 ILIKE 'abc%'"), "Field1 startswith 'abc'"),
+    ],
+)
+def test_like_policy(like_policy, f, expected):
+    policy_engine = create_engine(
+        f"kustokql+https://localhost/testdb?like_policy={like_policy}"
+    )
+    policy_engine.dialect.create_connect_args(policy_engine.url)
+    query = select([column("Field1")]).select_from(text("logs")).where(f)
+    query_compiled = str(
+        query.compile(policy_engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    assert query_compiled == f'["logs"]| where {expected}| project ["Field1"]'
+
+
+def test_like_policy_dialect_argument():
+    policy_engine = create_engine(
+        "kustokql+https://localhost/testdb", like_policy="contains"
+    )
+    _, kwargs = policy_engine.dialect.create_connect_args(policy_engine.url)
+    assert "like_policy" not in kwargs
+    assert policy_engine.dialect.like_policy == "contains"
+
+
+def test_unknown_like_policy():
+    with pytest.raises(sa.exc.ArgumentError):
+        create_engine("kustokql+https://localhost/testdb", like_policy="regex")
+
+
+def test_predicate_ordering():
+    ordering_engine = create_engine(
+        "kustokql+https://localhost/testdb?like_policy=contains&partition_columns=TenantId"
+    )
+    _, kwargs = ordering_engine.dialect.create_connect_args(ordering_engine.url)
+    assert "partition_columns" not in kwargs
+    logs = Table(
+        "logs",
+        MetaData(),
+        Column("Timestamp", sa.DateTime),
+        Column("TenantId", String),
+        Column("Message", String),
+        Column("Duration", Integer),
+    )
+    query = (
+        select([logs.c.Message])
+        .where(logs.c.Message.like("%timeout%"))
+        .where(logs.c.Duration > literal_column("100"))
+        .where(logs.c.Timestamp >= datetime.datetime(2024, 1, 1))
+        .where(logs.c.TenantId == "contoso")
+        .where(text("Timestamp < ago(1h)"))
+        .where(
+            logs.c.Timestamp.between(
+                datetime.datetime(2024, 1, 1), datetime.datetime(2024, 2, 1)
+            )
+        )
+    )
+    query_compiled = str(
+        query.compile(ordering_engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    assert query_compiled == (
+        '["logs"]'
+        '| where ["Timestamp"]>= datetime(2024-01-01T00:00:00) '
+        "and [\"TenantId\"] == 'contoso' and Timestamp < ago(1h) "
+        'and ["Timestamp"] between (datetime(2024-01-01T00:00:00)..datetime(2024-02-01T00:00:00))'
+        '| where ["Duration"] > 100 and ["Message"] contains_cs \'timeout\''
+        '| project ["Message"]'
+    )
+
+
+def test_large_in_list():
+    values = [f"value.{i}" for i in range(KustoKqlCompiler.in_list_let_threshold)]
+    query = (
+        select([column("Field1")])
+        .select_from(text("logs"))
+        .where(Column("Field1", String).in_(values))
+        .where(Column("Field2", Integer).notin_(list(range(200))))
+        .where(Column("Field3", String).in_(["a", "b"]))
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).split("\n")
+    assert query_compiled[0] == (
+        "let _in_list0 = dynamic([" + ",".join(f'"{value}"' for value in values) + "]);"
+    )
+    assert query_compiled[1] == (
+        f"let _in_list1 = dynamic([{','.join(str(i) for i in range(200))}]);"
+    )
+    assert query_compiled[2:] == [
+        '["logs"]',
+        '| where ["Field1"] in (_in_list0) and (["Field2"] !in (_in_list1)) '
+        "and [\"Field3\"] in ('a', 'b')",
+        '| project ["Field1"]',
+    ]
+
+
+def test_large_in_list_with_unsupported_values():
+    values = [f"value{i}" for i in range(KustoKqlCompiler.in_list_let_threshold)]
+    values.append(None)
+    query = (
+        select([column("Field1")])
+        .select_from(text("logs"))
+        .where(Column("Field1", String).in_(values))
+    )
+    query_compiled = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+    assert "_in_list" not in query_compiled
+
+
+def test_large_in_list_benchmark(monkeypatch):
+    values = [f"value{i}" for i in range(10_000)]
+    query = (
+        select([column("Field1")])
+        .select_from(text("logs"))
+        .where(Column("Field1", String).in_(values))
+    )
+    # Every compilation is measured, rather than the compiled query cache
+    uncached_engine = create_engine(
+        "kustokql+https://localhost/testdb", compiled_cache_size=0
+    )
+
+    def measure() -> tuple[float, str]:
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            compiled = str(
+                query.compile(uncached_engine, compile_kwargs={"literal_binds": True})
+            )
+            timings.append(time.perf_counter() - start)
+        return min(timings), compiled
+
+    hoisted_time, hoisted = measure()
+    monkeypatch.setattr(KustoKqlCompiler, "in_list_let_threshold", sys.maxsize)
+    inline_time, inline = measure()
+    hoisted_size, inline_size = len(hoisted.encode()), len(inline.encode())
+    # Timings are only reported, as they depend on the load of the machine
+    print(  # noqa: T201
+        f"10k IN list: let binding {hoisted_time * 1000:.1f}ms / {hoisted_size} bytes, "
+        f"inline {inline_time * 1000:.1f}ms / {inline_size} bytes"
+    )
+    assert hoisted.startswith("let _in_list0 = dynamic([")
+    assert "_in_list" not in inline
+    assert hoisted_size < inline_size
+
+
+def test_wide_select_benchmark():
+    columns_count = 500
+    query = select(
+        [column(f"Field{i}").label(f"field_{i}") for i in range(columns_count)]
+    ).select_from(text("logs"))
+    # Every compilation is measured, rather than the compiled query cache
+    uncached_engine = create_engine(
+        "kustokql+https://localhost/testdb", compiled_cache_size=0
+    )
+    memoized_functions = (
+        KustoKqlCompiler._escape_and_quote_columns,
+        KustoKqlCompiler._convert_quoted_columns,
+    )
+
+    def measure() -> tuple[float, str]:
+        start = time.perf_counter()
+        compiled = str(
+            query.compile(uncached_engine, compile_kwargs={"literal_binds": True})
+        )
+        return time.perf_counter() - start, compiled
+
+    for memoized_function in memoized_functions:
+        memoized_function.cache_clear()
+    cold_time, cold_compiled = measure()
+    warm_time, warm_compiled = min(measure() for _ in range(3))
+    print(  # noqa: T201
+        f"{columns_count} columns: first compilation "
+        f"{cold_time / columns_count * 1_000_000:.1f}us per column, "
+        f"memoized quoting {warm_time / columns_count * 1_000_000:.1f}us per column"
+    )
+    assert warm_compiled == cold_compiled
+    assert '["field_499"] = ["Field499"]' in warm_compiled
+    assert KustoKqlCompiler._escape_and_quote_columns.cache_info().hits >= columns_count
+
+
+def test_query_parameters_mode():
+    parameters_engine = create_engine(
+        "kustokql+https://localhost/testdb?query_parameters=true"
+    )
+    _, kwargs = parameters_engine.dialect.create_connect_args(parameters_engine.url)
+    assert kwargs["query_parameters"] is True
+
+    query = (
+        select([column("Field1")])
+        .select_from(text("logs"))
+        .where(Column("Field1", String) == "value")
+        .where(Column("Field2", String).like("%abc%"))
+        .where(Column("Field3", Integer).in_(list(range(200))))
+    )
+    compiled = query.compile(parameters_engine)
+    assert str(compiled).replace("\n", "") == (
+        '["logs"]'
+        '| where ["Field1"] == %(Field1_1)s and ["Field2"] has_cs \'abc\' '
+        'and ["Field3"] in (__[POSTCOMPILE_Field3_1])'
+        '| project ["Field1"]'
+    )
+    assert compiled.construct_params()["Field1_1"] == "value"
+
+
 def test_group_by_text():
     # create a query from select_query_text creating clause
     event_col = literal_column('"EventInfo_Time" / time(1d)').label("EventInfo_Time")
@@ -211,184 +475,1416 @@ def test_function_text(f: str, expected: str):
     assert query_compiled == query_expected
 
 
-def test_group_by_text_vaccine_dataset():
-    # SQL: SELECT country_name AS country_name FROM superset."CovidVaccineData" GROUP BY country_name
-    # ORDER BY country_name ASC - this is a simple query to get distinct country names
+@pytest.mark.parametrize(
+    ("url_query", "group_by", "statement_hint", "expected"),
+    [
+        pytest.param("", ["Host"], None, "", id="no_hint"),
+        pytest.param(
+            "",
+            ["Host"],
+            "hint.strategy=shuffle hint.num_partitions=10",
+            "hint.strategy=shuffle hint.num_partitions=10 ",
+            id="statement_hint",
+        ),
+        pytest.param(
+            "?shuffle_keys=UserId,OrderId",
+            ["UserId", "Host"],
+            None,
+            'hint.shufflekey = ["UserId"] ',
+            id="shuffle_key",
+        ),
+        pytest.param(
+            "?shuffle_min_group_by_columns=2",
+            ["UserId", "Host"],
+            None,
+            "hint.strategy = shuffle ",
+            id="group_by_columns",
+        ),
+        pytest.param(
+            "?shuffle_min_group_by_columns=3",
+            ["UserId", "Host"],
+            None,
+            "",
+            id="few_group_by_columns",
+        ),
+    ],
+)
+def test_summarize_shuffle_hint(url_query, group_by, statement_hint, expected):
+    shuffle_engine = create_engine(f"kustokql+https://localhost/testdb{url_query}")
+    shuffle_engine.dialect.create_connect_args(shuffle_engine.url)
     query = (
-        select([literal_column("country_name").label("country_name")])
-        .select_from(text('superset."CovidVaccineData"'))
-        .group_by(literal_column("country_name"))
-        .order_by(text("country_name ASC"))
+        select([column("Host"), literal_column("count(*)").label("total")])
+        .select_from(text("logs"))
+        .group_by(*[column(name) for name in group_by])
+    )
+    if statement_hint:
+        query = query.with_statement_hint(statement_hint)
+    query_compiled = str(query.compile(shuffle_engine)).replace("\n", "")
+    assert f'| summarize {expected}["total"] = count()' in query_compiled
+
+
+@pytest.mark.parametrize(
+    ("unit", "expected"),
+    [
+        pytest.param("minute", 'bin(["Timestamp"], 1m)'),
+        pytest.param("hour", 'bin(["Timestamp"], 1h)'),
+        pytest.param("day", 'startofday(["Timestamp"])'),
+        pytest.param("week", 'startofweek(["Timestamp"] - 1d) + 1d'),
+        pytest.param("month", 'startofmonth(["Timestamp"])'),
+        pytest.param(
+            "quarter",
+            "datetime_add('month', -((getmonth([\"Timestamp\"]) - 1) % 3), "
+            'startofmonth(["Timestamp"]))',
+        ),
+        pytest.param("YEAR", 'startofyear(["Timestamp"])'),
+    ],
+)
+def test_date_trunc(unit, expected):
+    timestamp = sa.func.date_trunc(unit, column("Timestamp")).label("__timestamp")
+    query = (
+        select([timestamp, literal_column("count(*)").label("total")])
+        .select_from(text("logs"))
+        .where(
+            sa.func.date_trunc(unit, column("Timestamp")) > literal_column("ago(7d)")
+        )
+        .group_by(timestamp)
     )
     query_compiled = str(
         query.compile(engine, compile_kwargs={"literal_binds": True})
     ).replace("\n", "")
     query_expected = (
-        'database("superset").["CovidVaccineData"]| '
-        'extend ["country_name"] = ["country_name"]| '
-        'summarize   by ["country_name"]| '
-        'project ["country_name"]| order by ["country_name"] asc'
+        '["logs"]'
+        f"| where {expected} > ago(7d)"
+        f'| extend ["__timestamp"] = {expected}'
+        '| summarize ["total"] = count()  by ["__timestamp"]'
+        '| project ["__timestamp"], ["total"]'
     )
     assert query_compiled == query_expected
 
 
-def test_is_kql_function():
-    assert KustoKqlCompiler._is_kql_function(
-        """case(Size <= 3, "Small",
-                       Size <= 10, "Medium",
-                       "Large")"""
+def test_date_trunc_week_starts_on_monday():
+    query = select(
+        [sa.func.date_trunc("week", column("Timestamp")).label("__timestamp")]
+    ).select_from(text("logs"))
+    query_compiled = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+    expression = query_compiled.split(" = ", 1)[1].split("\n", 1)[0]
+
+    def startofweek(value):
+        # KQL weeks start on Sunday
+        return value - datetime.timedelta(days=(value.weekday() + 1) % 7)
+
+    # Evaluates the KQL expression for a Sunday, which belongs to the week of the previous Monday
+    sunday = datetime.datetime(2024, 1, 7)
+    python_expression = expression.replace('["Timestamp"]', "timestamp").replace(
+        "1d", "datetime.timedelta(days=1)"
     )
-    assert KustoKqlCompiler._is_kql_function("""bin(time(16d), 7d)""")
-    assert KustoKqlCompiler._is_kql_function(
-        """iff((EventType in ("Heavy Rain", "Flash Flood", "Flood")), "Rain event", "Not rain event")"""
+    week_start = eval(
+        python_expression,
+        {"datetime": datetime, "startofweek": startofweek, "timestamp": sunday},
     )
+    assert week_start == datetime.datetime(2024, 1, 1)
 
 
-def test_percentile_by_text():
-    event_col = literal_column("percentile(quantity_ordered, 99)").label("Measure 1")
-    query = select(
-        [
-            event_col,
-        ]
-    ).select_from(text("SalesData"))
-    query_compiled = str(
-        query.compile(engine, compile_kwargs={"literal_binds": True})
-    ).replace("\n", "")
-    # raw query text from query
-    query_expected = (
-        '["SalesData"]'
-        '| summarize ["Measure 1"] = percentile(["quantity_ordered"], 99) '
-        '| project ["Measure 1"]'
-    )
-    assert query_compiled == query_expected
+class _RecordingCursor:
+    """DBAPI cursor that records the executed statements instead of running them."""
 
+    description = None
+    rowcount = -1
 
-def test_dcountif_by_text():
-    event_col = literal_column(
-        "dcountif(year, city == 'Paris' or city in ('Madrid'))"
-    ).label("Measure 1")
-    query = select(
-        [
-            event_col,
-        ]
-    ).select_from(text("SalesData"))
-    query_compiled = str(
-        query.compile(engine, compile_kwargs={"literal_binds": True})
-    ).replace("\n", "")
-    # raw query text from query
-    query_expected = (
-        '["SalesData"]'
-        "| summarize [\"Measure 1\"] = dcountif([\"year\"], city == 'Paris' or city in ('Madrid')) "
-        '| project ["Measure 1"]'
+    def __init__(self, statements: list[str]):
+        self.statements = statements
+
+    def execute(self, operation, parameters=None):
+        self.statements.append(operation)
+
+    def close(self):
+        pass
+
+
+class _RecordingConnection:
+    def __init__(self, statements: list[str]):
+        self.statements = statements
+
+    def cursor(self):
+        return _RecordingCursor(self.statements)
+
+    def close(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def commit(self):
+        pass
+
+
+def _execute_on_one_engine(query_parameters: bool, *queries) -> list[str]:
+    """Executes the queries on a new engine, later queries reuse the statements compiled by earlier ones."""
+    statements: list[str] = []
+    recording_engine = create_engine(
+        "kustokql+https://localhost/testdb"
+        f"?query_parameters={str(query_parameters).lower()}",
+        creator=lambda: _RecordingConnection(statements),
     )
-    assert query_compiled == query_expected
+    with recording_engine.connect() as connection:
+        for query in queries:
+            connection.execute(query)
+    return statements
 
 
-def test_countif_by_text():
-    event_col = literal_column("countif(city == 'Paris' OR city in ('Madrid'))").label(
-        "Measure 1"
+@pytest.mark.parametrize("query_parameters", [False, True])
+def test_date_trunc_unit_of_cached_statement(query_parameters):
+    queries = [
+        select(
+            [sa.func.date_trunc(unit, column("Timestamp")).label("__timestamp")]
+        ).select_from(text("logs"))
+        for unit in ("hour", "day")
+    ]
+    statements = _execute_on_one_engine(query_parameters, *queries)
+    assert '| extend ["__timestamp"] = bin(["Timestamp"], 1h)' in statements[0]
+    assert '| extend ["__timestamp"] = startofday(["Timestamp"])' in statements[1]
+
+
+def test_date_trunc_unknown_unit():
+    query = select([sa.func.date_trunc("decade", column("Timestamp"))]).select_from(
+        text("logs")
     )
-    query = select(
-        [
-            event_col,
-        ]
-    ).select_from(text("SalesData"))
-    query_compiled = str(
-        query.compile(engine, compile_kwargs={"literal_binds": True})
-    ).replace("\n", "")
-    # raw query text from query
-    query_expected = (
-        '["SalesData"]'
-        "| summarize [\"Measure 1\"] = countif(city == 'Paris' OR city in ('Madrid')) "
-        '| project ["Measure 1"]'
+    with pytest.raises(sa.exc.CompileError):
+        query.compile(engine)
+
+
+@pytest.mark.parametrize("time_grain", sorted(time_grain_expressions, key=str))
+def test_time_grain_expressions(time_grain):
+    quote = engine.dialect.identifier_preparer.quote
+    expression = time_grain_expressions[time_grain].format(col=quote("Timestamp"))
+    timestamp = literal_column(expression).label("__timestamp")
+    query = (
+        select([timestamp, literal_column("count(*)").label("total")])
+        .select_from(text("logs"))
+        .group_by(timestamp)
     )
-    assert query_compiled == query_expected
+    query_compiled = str(query.compile(engine)).replace("\n", "")
+    assert f'| extend ["__timestamp"] = {expression}' in query_compiled
+    assert '| summarize ["total"] = count()  by ["__timestamp"]' in query_compiled
 
 
-def test_distinct_count_by_text():
-    # create a query from select_query_text creating clause
-    # 'SELECT "EventInfo_Time" / time(1d) AS "EventInfo_Time", count(DISTINCT ActiveUsers) AS "DistinctUsers"
-    # FROM ActiveUsersLastMonth GROUP BY "EventInfo_Time" / time(1d) ORDER BY ActiveUserMetric DESC'
-    event_col = literal_column('"EventInfo_Time" / time(1d)').label("EventInfo_Time")
-    active_users_col = literal_column("ActiveUsers")
+def test_approximate():
+    logs = Table(
+        "logs",
+        MetaData(),
+        Column("UserId", String),
+        Column("Host", String),
+        Column("Duration", Integer),
+    )
     query = (
         select(
             [
-                event_col,
-                sa.func.count(distinct(active_users_col)).label("DistinctUsers"),
+                logs.c.Host,
+                sa.func.count(distinct(logs.c.UserId)).label("users"),
+                sa.func.median(logs.c.Duration).label("median"),
             ]
         )
-        .select_from(text("ActiveUsersLastMonth"))
-        .group_by(literal_column('"EventInfo_Time" / time(1d)'))
-        .order_by(text("ActiveUserMetric DESC"))
+        .where(logs.c.Host != "localhost")
+        .group_by(logs.c.Host)
+        .options(
+            Approximate(
+                sample=1000, sample_key="UserId", sample_percent=10, dcount_accuracy=3
+            )
+        )
     )
-    query_compiled = str(
-        query.compile(engine, compile_kwargs={"literal_binds": True})
-    ).replace("\n", "")
-    # raw query text from query
+    compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
     query_expected = (
-        '["ActiveUsersLastMonth"]'
-        '| extend ["EventInfo_Time"] = ["EventInfo_Time"] / time(1d)'
-        '| summarize ["DistinctUsers"] = dcount(["ActiveUsers"])  by ["EventInfo_Time"] / time(1d)'
-        '| project ["EventInfo_Time"], ["DistinctUsers"]'
-        '| order by ["ActiveUserMetric"] desc'
+        '["logs"]'
+        '| where hash(["UserId"], 100) < 10'
+        "| where [\"Host\"] != 'localhost'"
+        "| sample 1000"
+        '| summarize ["users"] = dcount(["UserId"], 3), ["median"] = percentile(["Duration"], 50)  by ["Host"]'
+        '| project ["Host"], ["users"], ["median"]'
     )
-    assert query_compiled == query_expected
+    assert str(compiled).replace("\n", "") == query_expected
+    assert compiled.approximate
+    context = KustoKqlExecutionContext.__new__(KustoKqlExecutionContext)
+    context.compiled = compiled
+    assert context.approximate
 
 
-def test_distinct_count_alt_by_text():
-    # create a query from select_query_text creating clause
-    # 'SELECT "EventInfo_Time" / time(1d) AS "EventInfo_Time", count_distinct(ActiveUsers) AS "DistinctUsers"
-    # FROM ActiveUsersLastMonth GROUP BY "EventInfo_Time" / time(1d) ORDER BY ActiveUserMetric DESC'
-    event_col = literal_column("EventInfo_Time / time(1d)").label("EventInfo_Time")
-    active_users_col = literal_column("COUNT_DISTINCT(ActiveUsers)")
-    query = (
-        select([event_col, active_users_col.label("DistinctUsers")])
-        .select_from(text("ActiveUsersLastMonth"))
-        .group_by(literal_column("EventInfo_Time / time(1d)"))
-        .order_by(text("ActiveUserMetric DESC"))
+def test_approximate_changes_cache_key():
+    query = select([column("Host")]).select_from(text("logs"))
+    sampled = query.options(Approximate(sample=10))
+    assert query._generate_cache_key() != sampled._generate_cache_key()
+    assert (
+        sampled._generate_cache_key()
+        == query.options(Approximate(sample=10))._generate_cache_key()
     )
-    query_compiled = str(
-        query.compile(engine, compile_kwargs={"literal_binds": True})
-    ).replace("\n", "")
-    # raw query text from query
-    query_expected = (
-        '["ActiveUsersLastMonth"]'
-        '| extend ["EventInfo_Time"] = ["EventInfo_Time"] / time(1d)'
-        '| summarize ["DistinctUsers"] = dcount(["ActiveUsers"])  by ["EventInfo_Time"] / time(1d)'
-        '| project ["EventInfo_Time"], ["DistinctUsers"]'
+    assert (
+        sampled._generate_cache_key()
+        != query.options(Approximate(sample=20))._generate_cache_key()
+    )
+
+
+@pytest.mark.parametrize(
+    ("function", "expected", "approximate"),
+    [
+        pytest.param(
+            sa.func.percentile_cont(0.9).within_group(column("Duration")),
+            'percentile(["Duration"], 90)',
+            True,
+            id="percentile_cont",
+        ),
+        pytest.param(
+            sa.func.percentile_disc(0.9).within_group(column("Duration").desc()),
+            'percentile(["Duration"], 10)',
+            True,
+            id="percentile_disc_desc",
+        ),
+        pytest.param(
+            sa.func.count(distinct(column("UserId"))),
+            'dcount(["UserId"])',
+            True,
+            id="dcount",
+        ),
+        pytest.param(
+            sa.func.sum(column("Duration")), 'sum(["Duration"])', False, id="sum"
+        ),
+    ],
+)
+def test_approximate_aggregates(function, expected, approximate):
+    query = (
+        select([column("Host"), function.label("value")])
+        .select_from(text("logs"))
+        .group_by(column("Host"))
+    )
+    compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+    assert f'| summarize ["value"] = {expected}  by ["Host"]' in str(compiled)
+    assert compiled.approximate is approximate
+
+
+@pytest.mark.parametrize("query_parameters", [False, True])
+def test_percentile_fraction_of_cached_statement(query_parameters):
+    queries = [
+        select(
+            [
+                column("Host"),
+                sa.func.percentile_cont(fraction)
+                .within_group(column("Duration"))
+                .label("value"),
+            ]
+        )
+        .select_from(text("logs"))
+        .group_by(column("Host"))
+        for fraction in (0.9, 0.5)
+    ]
+    statements = _execute_on_one_engine(query_parameters, *queries)
+    assert 'percentile(["Duration"], 90)' in statements[0]
+    assert 'percentile(["Duration"], 50)' in statements[1]
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"sample_key": "UserId"}, {"sample_percent": 10}, {"dcount_accuracy": 5}],
+)
+def test_approximate_invalid_arguments(kwargs):
+    with pytest.raises(sa.exc.ArgumentError):
+        Approximate(**kwargs)
+
+
+def _series_query():
+    timestamp = sa.func.date_trunc("hour", column("Timestamp")).label("__timestamp")
+    return (
+        select(
+            [
+                timestamp,
+                column("Host"),
+                sa.func.count().label("total"),
+                sa.func.sum(column("Duration")).label("duration"),
+            ]
+        )
+        .select_from(text("logs"))
+        .group_by(timestamp, column("Host"))
+    )
+
+
+def test_make_series():
+    query = _series_query().options(
+        MakeSeries(
+            "__timestamp",
+            step="1h",
+            start=datetime.datetime(2024, 1, 1),
+            end="now()",
+        )
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    query_expected = (
+        '["logs"]'
+        '| extend ["__timestamp"] = bin(["Timestamp"], 1h)'
+        '| make-series ["total"] = count() default = 0, ["duration"] = sum(["Duration"]) default = 0 '
+        'on ["__timestamp"] from datetime(2024-01-01T00:00:00) to now() step 1h by ["Host"]'
+        '| mv-expand ["__timestamp"] to typeof(datetime), ["total"] to typeof(long), ["duration"]'
+        '| project ["__timestamp"], ["Host"], ["total"], ["duration"]'
+    )
+    assert query_compiled == query_expected
+
+
+def test_make_series_timedelta_step():
+    query = _series_query().options(
+        MakeSeries("__timestamp", step=datetime.timedelta(minutes=30), default=-1)
+    )
+    assert (
+        'default = -1 on ["__timestamp"] step time(0.00:30:00.0000000) by ["Host"]'
+        in str(query.compile(engine))
+    )
+
+
+@pytest.mark.parametrize(
+    ("default", "expected"),
+    [
+        pytest.param("none", "'none'", id="string"),
+        pytest.param("n/a 'unknown'", "'n/a \\'unknown\\''", id="string_with_quotes"),
+        pytest.param(True, "true", id="bool"),
+        pytest.param(0.5, "0.5", id="float"),
+        pytest.param(None, "dynamic(null)", id="null"),
+    ],
+)
+def test_make_series_default(default, expected):
+    query = _series_query().options(
+        MakeSeries("__timestamp", step="1h", default=default)
+    )
+    assert f'["total"] = count() default = {expected}, ' in str(query.compile(engine))
+
+
+# Quote, backslash, line break and tab, rendered as KQL escape sequences
+SPECIAL_STRING = "C:\\Temp\n\tuser's"
+SPECIAL_STRING_LITERAL = "'C:\\\\Temp\\n\\tuser\\'s'"
+
+
+@pytest.mark.parametrize(
+    ("query", "expected"),
+    [
+        pytest.param(
+            select([column("Host")])
+            .select_from(text("logs"))
+            .where(column("Message") == SPECIAL_STRING),
+            f'| where ["Message"] == {SPECIAL_STRING_LITERAL}',
+            id="where",
+        ),
+        pytest.param(
+            select([column("Host")])
+            .select_from(text("logs"))
+            .where(column("Message").in_([SPECIAL_STRING, "a"])),
+            f"| where [\"Message\"] in ({SPECIAL_STRING_LITERAL}, 'a')",
+            id="in",
+        ),
+        pytest.param(
+            select(
+                [
+                    sa.case(
+                        (column("Host") == SPECIAL_STRING, "a"), else_=SPECIAL_STRING
+                    ).label("value")
+                ]
+            ).select_from(text("logs")),
+            f'| extend ["value"] = iff((["Host"] == {SPECIAL_STRING_LITERAL}), \'a\', '
+            f"{SPECIAL_STRING_LITERAL})",
+            id="case",
+        ),
+    ],
+)
+def test_string_literal(query, expected):
+    query_compiled = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+    assert expected in query_compiled.split("\n")
+
+
+def test_make_series_time_column_not_grouped():
+    query = _series_query().options(MakeSeries("Timestamp", step="1h"))
+    with pytest.raises(sa.exc.CompileError):
+        query.compile(engine)
+
+
+def _window_logs() -> Table:
+    return Table(
+        "logs",
+        MetaData(),
+        Column("Timestamp", sa.DateTime),
+        Column("Host", String),
+        Column("Duration", Integer),
+    )
+
+
+def test_window_functions():
+    logs = _window_logs()
+    query = select(
+        [
+            logs.c.Host,
+            sa.func.row_number()
+            .over(partition_by=logs.c.Host, order_by=logs.c.Timestamp.desc())
+            .label("rn"),
+            sa.func.lag(logs.c.Duration)
+            .over(partition_by=logs.c.Host, order_by=logs.c.Timestamp.desc())
+            .label("prev_duration"),
+            sa.func.lead(logs.c.Duration, 2, 0)
+            .over(order_by=logs.c.Timestamp)
+            .label("next_duration"),
+            sa.func.sum(logs.c.Duration)
+            .over(order_by=logs.c.Timestamp)
+            .label("running_total"),
+        ]
+    ).where(logs.c.Duration > literal_column("1"))
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    query_expected = (
+        '["logs"]'
+        '| where ["Duration"] > 1'
+        '| sort by ["Host"] asc, ["Timestamp"] desc'
+        '| extend ["rn"] = row_number(1, ["Host"] != prev(["Host"])), '
+        '["prev_duration"] = iff(prev(["Host"], 1) == ["Host"], prev(["Duration"], 1), long(null))'
+        '| sort by ["Timestamp"] asc'
+        '| extend ["next_duration"] = next(["Duration"], 2, 0), '
+        '["running_total"] = row_cumsum(["Duration"])'
+        '| project ["Host"], ["rn"], ["prev_duration"], ["next_duration"], ["running_total"]'
+    )
+    assert query_compiled == query_expected
+
+
+@pytest.mark.parametrize("query_parameters", [False, True])
+def test_window_function_offset_of_cached_statement(query_parameters):
+    logs = _window_logs()
+    queries = [
+        select(
+            [
+                sa.func.lag(logs.c.Duration, offset, default)
+                .over(partition_by=logs.c.Host, order_by=logs.c.Timestamp)
+                .label("prev_duration")
+            ]
+        )
+        for offset, default in ((1, 0), (3, -1))
+    ]
+    statements = _execute_on_one_engine(query_parameters, *queries)
+    assert (
+        'iff(prev(["Host"], 1) == ["Host"], prev(["Duration"], 1, 0), 0)'
+        in statements[0]
+    )
+    assert (
+        'iff(prev(["Host"], 3) == ["Host"], prev(["Duration"], 3, -1), -1)'
+        in statements[1]
+    )
+
+
+@pytest.mark.parametrize(
+    ("function", "expected"),
+    [
+        pytest.param(
+            sa.func.rank(),
+            '| sort by ["Host"] asc, ["Duration"] asc'
+            '| extend ["value"] = row_rank_min(["Duration"], ["Host"] != prev(["Host"]))',
+            id="rank",
+        ),
+        pytest.param(
+            sa.func.dense_rank(),
+            '| sort by ["Host"] asc, ["Duration"] asc'
+            '| extend ["value"] = row_rank_dense(["Duration"], ["Host"] != prev(["Host"]))',
+            id="dense_rank",
+        ),
+        pytest.param(
+            sa.func.lead(column("Host"), 1, "none"),
+            '| sort by ["Host"] asc, ["Duration"] asc'
+            '| extend ["value"] = iff(next(["Host"], 1) == ["Host"], '
+            "next([\"Host\"], 1, 'none'), 'none')",
+            id="lead_with_default",
+        ),
+    ],
+)
+def test_partitioned_window_functions(function, expected):
+    logs = _window_logs()
+    query = select(
+        [
+            function.over(partition_by=logs.c.Host, order_by=logs.c.Duration).label(
+                "value"
+            )
+        ]
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    assert query_compiled == f'["logs"]{expected}| project ["value"]'
+
+
+def test_window_function_without_order():
+    logs = _window_logs()
+    query = select([logs.c.Host, sa.func.row_number().over().label("rn")])
+    query_compiled = str(query.compile(engine)).replace("\n", "")
+    assert query_compiled == (
+        '["logs"]| serialize| extend ["rn"] = row_number()| project ["Host"], ["rn"]'
+    )
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        pytest.param(
+            select(
+                [
+                    column("Host"),
+                    sa.func.row_number().over().label("rn"),
+                    sa.func.count().label("total"),
+                ]
+            )
+            .select_from(text("logs"))
+            .group_by(column("Host")),
+            id="group_by",
+        ),
+        pytest.param(
+            select(
+                [sa.func.ntile(4).over(order_by=column("Duration")).label("q")]
+            ).select_from(text("logs")),
+            id="unsupported_function",
+        ),
+    ],
+)
+def test_unsupported_window_functions(query):
+    with pytest.raises(sa.exc.CompileError):
+        query.compile(engine)
+
+
+@pytest.mark.parametrize(
+    ("expression", "expected"),
+    [
+        pytest.param(
+            sa.func.coalesce(column("Host"), "none"),
+            "coalesce([\"Host\"], 'none')",
+            id="coalesce",
+        ),
+        pytest.param(sa.func.lower(column("Host")), 'tolower(["Host"])', id="lower"),
+        pytest.param(sa.func.upper(column("Host")), 'toupper(["Host"])', id="upper"),
+        pytest.param(
+            sa.func.substring(column("Host"), 2, 3),
+            'substring(["Host"], 1, 3)',
+            id="substring",
+        ),
+        pytest.param(
+            sa.cast(column("Duration"), String),
+            'tostring(["Duration"])',
+            id="cast",
+        ),
+        pytest.param(
+            sa.extract("month", column("Timestamp")),
+            "datetime_part('month', [\"Timestamp\"])",
+            id="extract",
+        ),
+        pytest.param(
+            sa.extract("dow", column("Timestamp")),
+            'toint(dayofweek(["Timestamp"]) / 1d)',
+            id="extract_dow",
+        ),
+        pytest.param(sa.func.now(), "now()", id="now"),
+        pytest.param(
+            sa.func.date_add("day", 1, column("Timestamp")),
+            "datetime_add('day', 1, [\"Timestamp\"])",
+            id="date_add",
+        ),
+        pytest.param(
+            sa.case((column("Duration") > literal_column("100"), "slow"), else_="fast"),
+            "iff(([\"Duration\"] > 100), 'slow', 'fast')",
+            id="case_iff",
+        ),
+        pytest.param(
+            sa.case(
+                (column("Duration") > literal_column("100"), "slow"),
+                (column("Host") == "local", "fast"),
+            ),
+            "case(([\"Duration\"] > 100), 'slow', ([\"Host\"] == 'local'), 'fast', \"\")",
+            id="case",
+        ),
+        pytest.param(
+            sa.case({"a": 1, "b": 2}, value=column("Host"), else_=0),
+            "case([\"Host\"] == 'a', 1, [\"Host\"] == 'b', 2, 0)",
+            id="case_value",
+        ),
+    ],
+)
+def test_scalar_functions(expression, expected):
+    query = select([expression.label("value")]).select_from(text("logs"))
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    assert (
+        query_compiled == f'["logs"]| extend ["value"] = {expected}| project ["value"]'
+    )
+
+
+@pytest.mark.parametrize("query_parameters", [False, True])
+@pytest.mark.parametrize(
+    ("expressions", "expected"),
+    [
+        pytest.param(
+            [
+                sa.func.substring(column("Host"), 1, 3),
+                sa.func.substring(column("Host"), 2, 5),
+            ],
+            ['substring(["Host"], 0, 3)', 'substring(["Host"], 1, 5)'],
+            id="substring",
+        ),
+        pytest.param(
+            [
+                sa.func.coalesce(column("Host"), "a"),
+                sa.func.coalesce(column("Host"), "b"),
+            ],
+            ["coalesce([\"Host\"], 'a')", "coalesce([\"Host\"], 'b')"],
+            id="coalesce",
+        ),
+        pytest.param(
+            [
+                sa.case((column("Duration") > SLOW_DURATION, "slow"), else_="fast"),
+                sa.case(
+                    (column("Duration") > SLOWER_DURATION, "slower"), else_="faster"
+                ),
+            ],
+            [
+                "iff(([\"Duration\"] > 100), 'slow', 'fast')",
+                "iff(([\"Duration\"] > 200), 'slower', 'faster')",
+            ],
+            id="case",
+        ),
+        pytest.param(
+            [
+                sa.func.date_add("day", 1, column("Timestamp")),
+                sa.func.date_add("hour", 2, column("Timestamp")),
+            ],
+            [
+                "datetime_add('day', 1, [\"Timestamp\"])",
+                "datetime_add('hour', 2, [\"Timestamp\"])",
+            ],
+            id="date_add",
+        ),
+    ],
+)
+def test_scalar_functions_of_cached_statement(expressions, expected, query_parameters):
+    queries = [
+        select([expression.label("value")]).select_from(text("logs"))
+        for expression in expressions
+    ]
+    statements = _execute_on_one_engine(query_parameters, *queries)
+    assert [statement.split("\n")[1] for statement in statements] == [
+        f'| extend ["value"] = {kql_expression}' for kql_expression in expected
+    ]
+
+
+def test_scalar_functions_in_where():
+    query = (
+        select([column("Host")])
+        .select_from(text("logs"))
+        .where(sa.func.upper(column("Host")) == "LOCAL")
+        .where(
+            column("Timestamp")
+            > sa.func.date_add("hour", -1, sa.func.current_timestamp())
+        )
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    assert query_compiled == (
+        '["logs"]'
+        "| where toupper([\"Host\"]) == 'LOCAL' "
+        "and [\"Timestamp\"] > datetime_add('hour', -1, now())"
+        '| project ["Host"]'
+    )
+
+
+def test_distinct():
+    query = (
+        select([column("Host")])
+        .select_from(text("logs"))
+        .where(column("Host") != "local")
+        .distinct()
+        .order_by(text("Host ASC"))
+        .limit(1000)
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    assert query_compiled == (
+        '["logs"]'
+        "| where [\"Host\"] != 'local'"
+        '| distinct ["Host"]'
+        '| top 1000 by ["Host"] asc'
+    )
+
+
+@pytest.mark.parametrize(
+    ("group_by", "expected"),
+    [
+        pytest.param([column("Host")], '| project ["Host"], ["users"]', id="unique"),
+        pytest.param(
+            [column("Host"), column("Region")],
+            '| project ["Host"], ["users"]| distinct *',
+            id="duplicate",
+        ),
+    ],
+)
+def test_distinct_with_group_by(group_by, expected):
+    # Rows are unique when every GROUP BY column is selected
+    query = (
+        select([column("Host"), sa.func.count(distinct(column("User"))).label("users")])
+        .select_from(text("logs"))
+        .group_by(*group_by)
+        .distinct()
+    )
+    query_compiled = str(query.compile(engine)).replace("\n", "")
+    assert '| summarize ["users"] = dcount(["User"])  by ' in query_compiled
+    assert query_compiled.endswith(f'"]{expected}')
+
+
+def test_group_by_text_vaccine_dataset():
+    # SQL: SELECT country_name AS country_name FROM superset."CovidVaccineData" GROUP BY country_name
+    # ORDER BY country_name ASC - this is a simple query to get distinct country names
+    query = (
+        select([literal_column("country_name").label("country_name")])
+        .select_from(text('superset."CovidVaccineData"'))
+        .group_by(literal_column("country_name"))
+        .order_by(text("country_name ASC"))
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    query_expected = (
+        'database("superset").["CovidVaccineData"]| '
+        'extend ["country_name"] = ["country_name"]| '
+        'summarize   by ["country_name"]| '
+        'project ["country_name"]| order by ["country_name"] asc'
+    )
+    assert query_compiled == query_expected
+
+
+def test_is_kql_function():
+    assert KustoKqlCompiler._is_kql_function(
+        """case(Size <= 3, "Small",
+                       Size <= 10, "Medium",
+                       "Large")"""
+    )
+    assert KustoKqlCompiler._is_kql_function("""bin(time(16d), 7d)""")
+    assert KustoKqlCompiler._is_kql_function(
+        """iff((EventType in ("Heavy Rain", "Flash Flood", "Flood")), "Rain event", "Not rain event")"""
+    )
+
+
+def test_percentile_by_text():
+    event_col = literal_column("percentile(quantity_ordered, 99)").label("Measure 1")
+    query = select(
+        [
+            event_col,
+        ]
+    ).select_from(text("SalesData"))
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    # raw query text from query
+    query_expected = (
+        '["SalesData"]'
+        '| summarize ["Measure 1"] = percentile(["quantity_ordered"], 99) '
+        '| project ["Measure 1"]'
+    )
+    assert query_compiled == query_expected
+
+
+def test_dcountif_by_text():
+    event_col = literal_column(
+        "dcountif(year, city == 'Paris' or city in ('Madrid'))"
+    ).label("Measure 1")
+    query = select(
+        [
+            event_col,
+        ]
+    ).select_from(text("SalesData"))
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    # raw query text from query
+    query_expected = (
+        '["SalesData"]'
+        "| summarize [\"Measure 1\"] = dcountif([\"year\"], city == 'Paris' or city in ('Madrid')) "
+        '| project ["Measure 1"]'
+    )
+    assert query_compiled == query_expected
+
+
+def test_countif_by_text():
+    event_col = literal_column("countif(city == 'Paris' OR city in ('Madrid'))").label(
+        "Measure 1"
+    )
+    query = select(
+        [
+            event_col,
+        ]
+    ).select_from(text("SalesData"))
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    # raw query text from query
+    query_expected = (
+        '["SalesData"]'
+        "| summarize [\"Measure 1\"] = countif(city == 'Paris' OR city in ('Madrid')) "
+        '| project ["Measure 1"]'
+    )
+    assert query_compiled == query_expected
+
+
+def test_distinct_count_by_text():
+    # create a query from select_query_text creating clause
+    # 'SELECT "EventInfo_Time" / time(1d) AS "EventInfo_Time", count(DISTINCT ActiveUsers) AS "DistinctUsers"
+    # FROM ActiveUsersLastMonth GROUP BY "EventInfo_Time" / time(1d) ORDER BY ActiveUserMetric DESC'
+    event_col = literal_column('"EventInfo_Time" / time(1d)').label("EventInfo_Time")
+    active_users_col = literal_column("ActiveUsers")
+    query = (
+        select(
+            [
+                event_col,
+                sa.func.count(distinct(active_users_col)).label("DistinctUsers"),
+            ]
+        )
+        .select_from(text("ActiveUsersLastMonth"))
+        .group_by(literal_column('"EventInfo_Time" / time(1d)'))
+        .order_by(text("ActiveUserMetric DESC"))
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    # raw query text from query
+    query_expected = (
+        '["ActiveUsersLastMonth"]'
+        '| extend ["EventInfo_Time"] = ["EventInfo_Time"] / time(1d)'
+        '| summarize ["DistinctUsers"] = dcount(["ActiveUsers"])  by ["EventInfo_Time"] / time(1d)'
+        '| project ["EventInfo_Time"], ["DistinctUsers"]'
         '| order by ["ActiveUserMetric"] desc'
     )
+    assert query_compiled == query_expected
+
+
+def test_distinct_count_alt_by_text():
+    # create a query from select_query_text creating clause
+    # 'SELECT "EventInfo_Time" / time(1d) AS "EventInfo_Time", count_distinct(ActiveUsers) AS "DistinctUsers"
+    # FROM ActiveUsersLastMonth GROUP BY "EventInfo_Time" / time(1d) ORDER BY ActiveUserMetric DESC'
+    event_col = literal_column("EventInfo_Time / time(1d)").label("EventInfo_Time")
+    active_users_col = literal_column("COUNT_DISTINCT(ActiveUsers)")
+    query = (
+        select([event_col, active_users_col.label("DistinctUsers")])
+        .select_from(text("ActiveUsersLastMonth"))
+        .group_by(literal_column("EventInfo_Time / time(1d)"))
+        .order_by(text("ActiveUserMetric DESC"))
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    # raw query text from query
+    query_expected = (
+        '["ActiveUsersLastMonth"]'
+        '| extend ["EventInfo_Time"] = ["EventInfo_Time"] / time(1d)'
+        '| summarize ["DistinctUsers"] = dcount(["ActiveUsers"])  by ["EventInfo_Time"] / time(1d)'
+        '| project ["EventInfo_Time"], ["DistinctUsers"]'
+        '| order by ["ActiveUserMetric"] desc'
+    )
+
+    assert query_compiled == query_expected
+
+
+def test_escape_and_quote_columns():
+    assert (
+        KustoKqlCompiler._escape_and_quote_columns("EventInfo_Time")
+        == '["EventInfo_Time"]'
+    )
+    assert KustoKqlCompiler._escape_and_quote_columns('["UserId"]') == '["UserId"]'
+    assert (
+        KustoKqlCompiler._escape_and_quote_columns("EventInfo_Time / time(1d)")
+        == '["EventInfo_Time"] / time(1d)'
+    )
+
+
+def test_use_table():
+    metadata = MetaData()
+    stream = Table(
+        "logs",
+        metadata,
+        Column("Field1", String),
+        Column("Field2", String),
+    )
+
+    query = stream.select().limit(5)
+    query_compiled = str(query.compile(engine)).replace("\n", "")
+
+    query_expected = (
+        '["logs"]' '| project ["Field1"], ["Field2"]| take __[POSTCOMPILE_param_1]'
+    )
+    assert query_compiled == query_expected
+
+
+def _join_tables():
+    metadata = MetaData()
+    logs = Table("logs", metadata, Column("Id", Integer), Column("Host", String))
+    hosts = Table(
+        "hosts",
+        metadata,
+        Column("Host", String),
+        Column("Region", String),
+        schema="db2",
+    )
+    regions = Table(
+        "regions", metadata, Column("Region", String), Column("Name", String)
+    )
+    return logs, hosts, regions
+
+
+def test_multiple_joins():
+    value_to_filter = 8
+    logs, hosts, regions = _join_tables()
+    query = (
+        Session()
+        .query(logs.c.Id, regions.c.Name)
+        .outerjoin(hosts, logs.c.Host == hosts.c.Host)
+        .join(regions, regions.c.Region == hosts.c.Region)
+        .filter(logs.c.Id > value_to_filter)
+    )
+    query_compiled = str(
+        query.statement.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    query_expected = (
+        '["logs"]'
+        '| project ["Id"], ["Host"]'
+        '| join kind=leftouter (database("db2").["hosts"]'
+        '| project ["Region"], ["Host"]) on $left.["Host"] == $right.["Host"]'
+        '| join kind=inner (["regions"]'
+        '| project ["Name"], ["Region"]) on $left.["Region"] == $right.["Region"]'
+        '| where ["Id"] > 8'
+        '| project ["Id"], ["Name"]'
+    )
+    assert query_compiled == query_expected
+
+
+def test_join_with_multiple_conditions():
+    logs, hosts, _ = _join_tables()
+    query = select([logs.c.Id, hosts.c.Region]).select_from(
+        logs.join(
+            hosts,
+            sa.and_(logs.c.Host == hosts.c.Host, hosts.c.Region == logs.c.Id),
+            full=True,
+        )
+    )
+    query_compiled = str(query.compile(engine)).replace("\n", "")
+    query_expected = (
+        '["logs"]'
+        '| project ["Id"], ["Host"]'
+        '| join kind=fullouter (database("db2").["hosts"]'
+        '| project ["Region"], ["Host"]) '
+        'on $left.["Host"] == $right.["Host"] and $left.["Id"] == $right.["Region"]'
+        '| project ["Id"], ["Region"]'
+    )
+    assert query_compiled == query_expected
+
 
+def test_nested_join():
+    logs, hosts, regions = _join_tables()
+    query = select([logs.c.Id]).select_from(
+        logs.join(
+            hosts.join(regions, hosts.c.Region == regions.c.Region),
+            logs.c.Host == hosts.c.Host,
+        )
+    )
+    query_compiled = str(query.compile(engine)).replace("\n", "")
+    query_expected = (
+        '["logs"]'
+        '| project ["Id"], ["Host"]'
+        '| join kind=inner (database("db2").["hosts"]'
+        '| project ["Host"], ["Region"]'
+        '| join kind=inner (["regions"]'
+        '| project ["Region"]) on $left.["Region"] == $right.["Region"]) '
+        'on $left.["Host"] == $right.["Host"]'
+        '| project ["Id"]'
+    )
     assert query_compiled == query_expected
 
 
-def test_escape_and_quote_columns():
+def test_join_without_projection():
+    # Columns without a table may come from any side of the join
+    logs, hosts, _ = _join_tables()
+    query = (
+        select([logs.c.Id])
+        .select_from(logs.join(hosts, logs.c.Host == hosts.c.Host))
+        .where(text("Region == 'west'"))
+    )
+    query_compiled = str(query.compile(engine)).replace("\n", "")
+    assert query_compiled == (
+        '["logs"]'
+        '| join kind=inner (database("db2").["hosts"]) on $left.["Host"] == $right.["Host"]'
+        "| where Region == 'west'"
+        '| project ["Id"]'
+    )
+
+
+def _sampled_join(sample_key: str):
+    logs, hosts, _ = _join_tables()
+    return (
+        select([hosts.c.Region, sa.func.count(logs.c.Host).label("total")])
+        .select_from(logs.join(hosts, logs.c.Host == hosts.c.Host))
+        .group_by(hosts.c.Region)
+        .options(Approximate(sample_key=sample_key, sample_percent=10))
+    )
+
+
+def test_join_with_hash_sampling():
+    # The sampling key is projected although the query doesn't refer to it
+    query_compiled = str(
+        _sampled_join("Id").compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    assert query_compiled == (
+        '["logs"]'
+        '| project ["Host"], ["Id"]'
+        '| join kind=inner (database("db2").["hosts"]'
+        '| project ["Region"], ["Host"]) on $left.["Host"] == $right.["Host"]'
+        '| where hash(["Id"], 100) < 10'
+        '| summarize ["total"] = count(["Host"])  by ["Region"]'
+        '| project ["Region"], ["total"]'
+    )
+
+    # The sampling key of none of the tables may come from any side of the join
+    query_compiled = str(
+        _sampled_join("UserId").compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    assert '["logs"]| join kind=inner (database("db2").["hosts"]) on' in query_compiled
+
+
+@pytest.mark.parametrize(
+    ("dialect_name", "expected"),
+    [
+        pytest.param("kustokql", "kind=inner hint.strategy=broadcast", id="dialect"),
+        pytest.param("*", "kind=inner hint.strategy=broadcast", id="any_dialect"),
+        pytest.param("kustosql", "kind=inner", id="other_dialect"),
+    ],
+)
+def test_join_hint(dialect_name, expected):
+    logs, hosts, _ = _join_tables()
+    query = (
+        select([logs.c.Id])
+        .select_from(logs.join(hosts, logs.c.Host == hosts.c.Host))
+        .with_hint(hosts, "hint.strategy=broadcast", dialect_name=dialect_name)
+    )
+    query_compiled = str(query.compile(engine)).replace("\n", "")
     assert (
-        KustoKqlCompiler._escape_and_quote_columns("EventInfo_Time")
-        == '["EventInfo_Time"]'
+        f'| join {expected} (database("db2").["hosts"]| project ["Host"])'
+        in query_compiled
     )
-    assert KustoKqlCompiler._escape_and_quote_columns('["UserId"]') == '["UserId"]'
+
+
+@pytest.mark.parametrize(
+    "hint",
+    [
+        "hint.strategy=shuffle hint.shufflekey=Host",
+        "kind=leftsemi hint.strategy=broadcast",
+    ],
+)
+def test_join_hint_options(hint):
+    logs, hosts, _ = _join_tables()
+    query = (
+        select([logs.c.Id])
+        .select_from(logs.outerjoin(hosts, logs.c.Host == hosts.c.Host))
+        .with_hint(hosts, hint)
+    )
+    expected = hint if "kind=" in hint else f"kind=leftouter {hint}"
+    query_compiled = str(query.compile(engine)).replace("\n", "")
     assert (
-        KustoKqlCompiler._escape_and_quote_columns("EventInfo_Time / time(1d)")
-        == '["EventInfo_Time"] / time(1d)'
+        f'| join {expected} (database("db2").["hosts"]| project ["Host"])'
+        in query_compiled
     )
 
 
-def test_use_table():
-    metadata = MetaData()
-    stream = Table(
-        "logs",
-        metadata,
-        Column("Field1", String),
-        Column("Field2", String),
+def _series_limit_subquery(logs):
+    host = logs.c.Host.label("Host__")
+    return (
+        select([host, sa.func.count(logs.c.Id).label("mme_inner__")])
+        .group_by(host)
+        .order_by(text("mme_inner__ DESC"))
+        .limit(5)
+        .subquery("series_limit")
     )
 
-    query = stream.select().limit(5)
+
+def test_series_limit_join():
+    logs, _, _ = _join_tables()
+    series_limit = _series_limit_subquery(logs)
+    query = (
+        select([logs.c.Host, sa.func.count(logs.c.Id).label("total")])
+        .select_from(logs.join(series_limit, logs.c.Host == series_limit.c.Host__))
+        .group_by(logs.c.Host)
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    query_expected = (
+        'let series_limit = (["logs"]'
+        '| extend ["Host__"] = ["Host"]'
+        '| summarize ["mme_inner__"] = count(["Id"])  by ["Host__"]'
+        '| project ["Host__"], ["mme_inner__"]'
+        '| top 5 by ["mme_inner__"] desc);'
+        '["logs"]'
+        '| project ["Host"], ["Id"]'
+        "| join kind=leftsemi hint.strategy=broadcast (series_limit) "
+        'on $left.["Host"] == $right.["Host__"]'
+        '| summarize ["total"] = count(["Id"])  by ["Host"]'
+        '| project ["Host"], ["total"]'
+    )
+    assert query_compiled == query_expected
+
+
+@pytest.mark.parametrize(
+    ("outer_join", "select_measure", "hint", "expected"),
+    [
+        pytest.param(True, False, None, "kind=leftouter", id="outer_join"),
+        pytest.param(False, True, None, "kind=inner", id="right_columns_selected"),
+        pytest.param(
+            False,
+            False,
+            "hint.strategy=shuffle",
+            "kind=inner hint.strategy=shuffle",
+            id="user_hint",
+        ),
+    ],
+)
+def test_series_limit_join_not_applied(outer_join, select_measure, hint, expected):
+    logs, _, _ = _join_tables()
+    series_limit = _series_limit_subquery(logs)
+    columns = [logs.c.Host]
+    if select_measure:
+        columns.append(series_limit.c.mme_inner__)
+    query = select(columns).select_from(
+        logs.join(
+            series_limit, logs.c.Host == series_limit.c.Host__, isouter=outer_join
+        )
+    )
+    if hint:
+        query = query.with_hint(series_limit, hint)
+    query_compiled = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+    assert f"| join {expected} (series_limit)" in query_compiled
+
+
+def _latest_rows_subquery(logs):
+    # Not grouped, several rows of the subquery may have the same host
+    return (
+        select([logs.c.Host.label("Host__")])
+        .order_by(logs.c.Id.desc())
+        .limit(5)
+        .subquery("series_limit")
+    )
+
+
+def _host_id_limit_subquery(logs):
+    # Grouped by the host and the id, several rows of the subquery may have the same host
+    host = logs.c.Host.label("Host__")
+    return (
+        select([host, logs.c.Id, sa.func.count().label("mme_inner__")])
+        .group_by(host, logs.c.Id)
+        .order_by(text("mme_inner__ DESC"))
+        .limit(5)
+        .subquery("series_limit")
+    )
+
+
+@pytest.mark.parametrize("subquery", [_latest_rows_subquery, _host_id_limit_subquery])
+def test_series_limit_join_not_grouped_by_join_key(subquery):
+    logs, _, _ = _join_tables()
+    series_limit = subquery(logs)
+    query = select([logs.c.Id]).select_from(
+        logs.join(series_limit, logs.c.Host == series_limit.c.Host__)
+    )
+    query_compiled = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+    assert "| join kind=inner (series_limit)" in query_compiled
+
+
+def test_join_with_same_column_names():
+    # Columns of both sides of an inner join on their equality have the same values
+    logs, hosts, _ = _join_tables()
+    query = select([logs.c.Id, hosts.c.Host]).select_from(
+        logs.join(hosts, logs.c.Host == hosts.c.Host)
+    )
     query_compiled = str(query.compile(engine)).replace("\n", "")
+    assert query_compiled.endswith('| project ["Id"], ["Host"]')
+
+    # Right side columns labeled in a subquery have unique names
+    other_logs = select([logs.c.Id, logs.c.Host.label("OtherHost")]).subquery("other")
+    query = select([logs.c.Host, other_logs.c.OtherHost]).select_from(
+        logs.join(other_logs, logs.c.Id == other_logs.c.Id)
+    )
+    query_compiled = str(query.compile(engine)).replace("\n", "")
+    assert query_compiled.endswith('| project ["Host"], ["OtherHost"]')
+
+
+def _self_join():
+    logs, _, _ = _join_tables()
+    left, right = logs.alias("l1"), logs.alias("l2")
+    return select([left.c.Host, right.c.Host.label("Host2")]).select_from(
+        left.join(right, left.c.Id == right.c.Id)
+    )
+
+
+def _outer_join_key():
+    logs, hosts, _ = _join_tables()
+    return select([logs.c.Id, hosts.c.Host]).select_from(
+        logs.outerjoin(hosts, logs.c.Host == hosts.c.Host)
+    )
+
+
+@pytest.mark.parametrize(
+    ("query", "message"),
+    [
+        pytest.param(_self_join(), "of several joined tables", id="self_join"),
+        pytest.param(_outer_join_key(), "is renamed by Kusto", id="outer_join_key"),
+    ],
+)
+def test_join_with_ambiguous_columns(query, message):
+    with pytest.raises(sa.exc.CompileError, match=message):
+        query.compile(engine)
+
 
+def test_join_with_unsupported_condition():
+    logs, hosts, _ = _join_tables()
+    query = select([logs.c.Id]).select_from(
+        logs.join(hosts, logs.c.Host != hosts.c.Host)
+    )
+    with pytest.raises(sa.exc.CompileError):
+        query.compile(engine)
+
+
+def test_union_all():
+    logs, hosts, _ = _join_tables()
+    query = sa.union_all(
+        select([logs.c.Host]).where(logs.c.Id > 1),
+        select([hosts.c.Host]),
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
     query_expected = (
-        '["logs"]' '| project ["Field1"], ["Field2"]| take __[POSTCOMPILE_param_1]'
+        'union (["logs"]| where ["Id"] > 1| project ["Host"]), '
+        '(database("db2").["hosts"]| project ["Host"])'
+    )
+    assert query_compiled == query_expected
+
+
+def test_union_with_order_by_and_limit():
+    logs, hosts, _ = _join_tables()
+    query = (
+        sa.union(select([logs.c.Host]), select([hosts.c.Host]))
+        .order_by(text("Host DESC"))
+        .limit(5)
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    query_expected = (
+        'union (["logs"]| project ["Host"]), (database("db2").["hosts"]| project ["Host"])'
+        "| distinct *"
+        '| top 5 by ["Host"] desc'
+    )
+    assert query_compiled == query_expected
+
+
+def test_union_hoists_let_statements():
+    logs, hosts, _ = _join_tables()
+    query = sa.union_all(
+        select([logs.c.Host]).where(logs.c.Id.in_(range(100))),
+        select([hosts.c.Host]).where(hosts.c.Region.in_(range(100))),
+    )
+    query_compiled = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+    lines = query_compiled.split("\n")
+    assert lines[0].startswith("let _in_list0 = dynamic(")
+    assert lines[1].startswith("let _in_list1 = dynamic(")
+    assert lines[2] == 'union (["logs"]'
+    assert '| where ["Region"] in (_in_list1)' in lines
+
+
+def test_intersect_is_not_supported():
+    logs, hosts, _ = _join_tables()
+    query = sa.intersect(select([logs.c.Host]), select([hosts.c.Host]))
+    with pytest.raises(sa.exc.CompileError):
+        query.compile(engine)
+
+
+def test_subquery():
+    logs, _, _ = _join_tables()
+    subquery = (
+        select([logs.c.Id, logs.c.Host.label("Server")])
+        .where(logs.c.Id > 1)
+        .subquery("filtered")
+    )
+    query = select([subquery.c.Server]).where(subquery.c.Id < literal_column("10"))
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    query_expected = (
+        'let filtered = (["logs"]'
+        '| where ["Id"] > 1'
+        '| extend ["Server"] = ["Host"]'
+        '| project ["Id"], ["Server"]);'
+        "filtered"
+        '| where ["Id"] < 10'
+        '| project ["Server"]'
+    )
+    assert query_compiled == query_expected
+
+
+def test_nested_subqueries():
+    logs, _, _ = _join_tables()
+    inner = select([logs.c.Id]).where(logs.c.Id.in_(range(100))).subquery("inner")
+    outer = select([inner.c.Id]).subquery("outer")
+    query = select([outer.c.Id])
+    lines = str(query.compile(engine, compile_kwargs={"literal_binds": True})).split(
+        "\n"
+    )
+    assert lines[0].startswith("let _in_list0 = dynamic(")
+    assert lines[1:] == [
+        'let inner = (["logs"]',
+        '| where ["Id"] in (_in_list0)',
+        '| project ["Id"]);',
+        "let outer = (inner",
+        '| project ["Id"]);',
+        "outer",
+        '| project ["Id"]',
+    ]
+
+
+def test_cte_referenced_twice_is_materialized():
+    logs, _, _ = _join_tables()
+    counts = (
+        select([logs.c.Host, literal_column("count(*)").label("total")])
+        .group_by(logs.c.Host)
+        .cte("counts")
+    )
+    query = sa.union_all(
+        select([counts.c.Host]).where(counts.c.total > 1),
+        select([counts.c.Host]).where(counts.c.total < 1),
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    query_expected = (
+        'let counts = materialize(["logs"]'
+        '| summarize ["total"] = count()  by ["Host"]'
+        '| project ["Host"], ["total"]);'
+        'union (counts| where ["total"] > 1| project ["Host"]), '
+        '(counts| where ["total"] < 1| project ["Host"])'
+    )
+    assert query_compiled == query_expected
+
+
+def test_subquery_of_orm_union():
+    logs, hosts, _ = _join_tables()
+    session = Session()
+    query = (
+        session.query(logs.c.Host).union_all(session.query(hosts.c.Region)).statement
+    )
+    query_compiled = str(query.compile(engine)).replace("\n", "")
+    query_expected = (
+        'let anon_1 = (union (["logs"]| project ["Host"]| project-rename ["logs_Host"] = ["Host"]), '
+        '(database("db2").["hosts"]| project ["Region"]| project-rename ["logs_Host"] = ["Region"]));'
+        "anon_1"
+        '| project ["logs_Host"]'
     )
     assert query_compiled == query_expected
 
@@ -428,15 +1924,209 @@ def test_select_count():
         'let inner_qry = (["logs"]);'
         "inner_qry"
         "| where Field1 > 1 and Field2 < 2"
-        '| summarize ["total-count"] = count() '
-        '| project ["total-count"]'
-        '| order by ["total-count"] desc'
-        "| take 5"
+        "| count"
+        '| project-rename ["total-count"] = Count'
+        '| top 5 by ["total-count"] desc'
     )
 
     assert query_compiled == query_expected
 
 
+@pytest.mark.parametrize(
+    ("count_column", "group_by", "expected"),
+    [
+        pytest.param(
+            sa.func.count().label("total"),
+            None,
+            '| count| project-rename ["total"] = Count',
+            id="count_star",
+        ),
+        pytest.param(
+            literal_column("count(1)").label("total"),
+            None,
+            '| count| project-rename ["total"] = Count',
+            id="count_one",
+        ),
+        pytest.param(
+            literal_column("COUNT(*)"), None, "| count", id="count_without_alias"
+        ),
+        pytest.param(
+            sa.func.count(literal_column("Field1")).label("total"),
+            None,
+            '| summarize ["total"] = count(["Field1"]) | project ["total"]',
+            id="count_column",
+        ),
+        pytest.param(
+            sa.func.count().label("total"),
+            literal_column("Field1"),
+            '| summarize ["total"] = count()  by ["Field1"]| project ["total"]',
+            id="count_with_group_by",
+        ),
+    ],
+)
+def test_row_count(count_column, group_by, expected):
+    query = select([count_column]).select_from(text("logs")).where(text("Field2 > 1"))
+    if group_by is not None:
+        query = query.group_by(group_by)
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    assert query_compiled == f'["logs"]| where Field2 > 1{expected}'
+
+
+def test_row_count_from_let_subquery():
+    kql_query = "let x = 5; MyTable | where Field1 == x"
+    query = select([sa.func.count().label("total")]).select_from(
+        TextAsFrom(text(kql_query), ["*"]).alias("inner_qry")
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    assert query_compiled == (
+        "let x = 5;"
+        'let inner_qry = (["MyTable"] | where Field1 == x);'
+        "inner_qry"
+        "| count"
+        '| project-rename ["total"] = Count'
+    )
+
+
+@pytest.mark.parametrize(
+    ("order_by", "limit", "expected"),
+    [
+        pytest.param(
+            [text("Field1 DESC")], 10, '| top 10 by ["Field1"] desc', id="top"
+        ),
+        pytest.param(
+            [text("Field1 ASC"), text("Field2 DESC")],
+            10,
+            '| top 10 by ["Field1"] asc, ["Field2"] desc',
+            id="top_multiple_columns",
+        ),
+        pytest.param(
+            [text("Field1 DESC")], None, '| order by ["Field1"] desc', id="order_by"
+        ),
+        pytest.param([], 10, "| take 10", id="take"),
+    ],
+)
+def test_order_by_with_limit(order_by, limit, expected):
+    query = (
+        select([column("Field1"), column("Field2")])
+        .select_from(text("logs"))
+        .order_by(*order_by)
+        .limit(limit)
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    assert query_compiled == f'["logs"]| project ["Field1"], ["Field2"]{expected}'
+
+
+@pytest.mark.parametrize(
+    ("order_by", "limit", "expected"),
+    [
+        pytest.param(
+            [text("Field1 DESC")],
+            10,
+            '| order by ["Field1"] desc'
+            "| serialize _rn = row_number()"
+            "| where _rn > 20"
+            "| take 10"
+            "| project-away _rn",
+            id="page",
+        ),
+        pytest.param(
+            [],
+            None,
+            "| serialize _rn = row_number()| where _rn > 20| project-away _rn",
+            id="offset_only",
+        ),
+    ],
+)
+def test_offset(order_by, limit, expected):
+    query = (
+        select([column("Field1"), column("Field2")])
+        .select_from(text("logs"))
+        .order_by(*order_by)
+        .limit(limit)
+        .offset(20)
+    )
+    query_compiled = str(
+        query.compile(engine, compile_kwargs={"literal_binds": True})
+    ).replace("\n", "")
+    assert query_compiled == f'["logs"]| project ["Field1"], ["Field2"]{expected}'
+
+
+def test_offset_is_post_compile_parameter():
+    # Pages of the same query share the cached compiled statement, the offset is rendered on execution
+    offset = 20
+    query = (
+        select([column("Field1")]).select_from(text("logs")).limit(10).offset(offset)
+    )
+    compiled = query.compile(engine)
+    assert "| where _rn > __[POSTCOMPILE_" in compiled.string
+    assert offset in compiled.params.values()
+
+
+def _virtual_dataset_query(value: int):
+    virtual_table = TextAsFrom(
+        text("let threshold = 5; logs | where Level > threshold"), ["*"]
+    ).alias("virtual_table")
+    return (
+        select([column("Host"), literal_column("count(*)").label("total")])
+        .select_from(virtual_table)
+        .where(column("Level") > value)
+        .group_by(column("Host"))
+    )
+
+
+def test_compiled_query_cache():
+    cache_engine = create_engine("kustokql+https://localhost/testdb")
+    cache_engine.dialect.create_connect_args(cache_engine.url)
+    compile_kwargs = {"literal_binds": True}
+    first = _virtual_dataset_query(1).compile(
+        cache_engine, compile_kwargs=compile_kwargs
+    )
+    second = _virtual_dataset_query(1).compile(
+        cache_engine, compile_kwargs=compile_kwargs
+    )
+    other_value = _virtual_dataset_query(2).compile(
+        cache_engine, compile_kwargs=compile_kwargs
+    )
+    assert str(second) == str(first)
+    assert '| where ["Level"] > 2' in str(other_value)
+    info = cache_engine.dialect.compiled_cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 2, 2)
+
+
+def test_compiled_query_cache_keeps_approximate_flag():
+    cache_engine = create_engine("kustokql+https://localhost/testdb")
+    query = _virtual_dataset_query(1).options(Approximate(sample=10))
+    for _ in range(2):
+        compiled = query.compile(cache_engine, compile_kwargs={"literal_binds": True})
+        assert compiled.approximate
+    assert cache_engine.dialect.compiled_cache_info().hits == 1
+
+
+def test_compiled_query_cache_skips_bound_parameters():
+    # Bound parameters are kept by the compiled statement, they are cached by SQLAlchemy
+    cache_engine = create_engine("kustokql+https://localhost/testdb")
+    for _ in range(2):
+        _virtual_dataset_query(1).compile(cache_engine)
+    assert cache_engine.dialect.compiled_cache_info().currsize == 0
+
+
+def test_compiled_query_cache_disabled():
+    cache_engine = create_engine(
+        "kustokql+https://localhost/testdb?compiled_cache_size=0"
+    )
+    _, kwargs = cache_engine.dialect.create_connect_args(cache_engine.url)
+    assert "compiled_cache_size" not in kwargs
+    assert cache_engine.dialect.compiled_cache_info() is None
+    query = _virtual_dataset_query(1)
+    assert str(query.compile(cache_engine, compile_kwargs={"literal_binds": True}))
+
+
 def test_select_with_let():
     kql_query = "let x = 5; let y = 3; MyTable | where Field1 == x and Field2 == y"
     query = (
@@ -0,0 +1,129 @@
+import time
+
+import pytest
+from azure.core.credentials import AccessToken
+from sqlalchemy import create_engine
+
+from sqlalchemy_kusto import errors
+from sqlalchemy_kusto.dbapi import Connection
+from sqlalchemy_kusto.token_cache import CachedTokenCredential, FileTokenCache
+
+
+class CountingCredential:
+    def __init__(self, expires_in: int = 3600):
+        self.calls = 0
+        self.expires_in = expires_in
+
+    def get_token(self, *scopes, **kwargs) -> AccessToken:
+        self.calls += 1
+        return AccessToken(f"token-{self.calls}", int(time.time()) + self.expires_in)
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "tokens.bin")
+
+
+def test_file_token_cache_is_shared_between_instances(cache_path):
+    first = FileTokenCache(cache_path, allow_unencrypted=True)
+    second = FileTokenCache(cache_path, allow_unencrypted=True)
+    token = AccessToken("secret", int(time.time()) + 3600)
+
+    first.save("key", token)
+
+    assert second.load("key") == token
+    assert second.load("other") is None
+
+
+def test_cached_credential_reuses_token(cache_path):
+    credential = CountingCredential()
+    scope = "https://kusto/.default"
+
+    first = CachedTokenCredential(
+        credential, FileTokenCache(cache_path, allow_unencrypted=True), "msi:system"
+    )
+    second = CachedTokenCredential(
+        credential, FileTokenCache(cache_path, allow_unencrypted=True), "msi:system"
+    )
+
+    assert first.get_token(scope).token == "token-1"
+    assert second.get_token(scope).token == "token-1"
+    assert credential.calls == 1
+
+
+def test_cached_credential_refreshes_expiring_token(cache_path):
+    credential = CountingCredential(expires_in=60)
+    cached = CachedTokenCredential(
+        credential, FileTokenCache(cache_path, allow_unencrypted=True), "msi:system"
+    )
+
+    cached.get_token("scope")
+
+    assert cached.get_token("scope").token == "token-2"
+
+
+def test_cached_credential_separates_identities(cache_path):
+    credential = CountingCredential()
+    cache = FileTokenCache(cache_path, allow_unencrypted=True)
+
+    system = CachedTokenCredential(credential, cache, "msi:system").get_token("scope")
+    user = CachedTokenCredential(credential, cache, "msi:user").get_token("scope")
+
+    assert system.token != user.token
+
+
+def test_connection_uses_cached_credential(cache_path):
+    connection = Connection(
+        "https://localhost",
+        "testdb",
+        msi=True,
+        user_msi="client-id",
+        token_cache_path=cache_path,
+        token_cache_allow_unencrypted=True,
+    )
+    credential = connection.kusto_client._kcsb.credential
+    assert isinstance(credential, CachedTokenCredential)
+    assert credential.identity == "msi:client-id"
+
+
+def test_workload_identities_use_separate_cache_entries(cache_path, monkeypatch):
+    credentials = []
+    for client_id in ("first-client-id", "second-client-id"):
+        monkeypatch.setenv("AZURE_TENANT_ID", "tenant-id")
+        monkeypatch.setenv("AZURE_CLIENT_ID", client_id)
+        connection = Connection(
+            "https://localhost",
+            "testdb",
+            workload_identity=True,
+            token_cache_path=cache_path,
+            token_cache_allow_unencrypted=True,
+        )
+        credential = connection.kusto_client._kcsb.credential
+        credential.credential = CountingCredential()
+        credentials.append(credential)
+    first, second = credentials
+
+    assert first.identity == "workload_identity:tenant-id:first-client-id"
+    assert second.identity == "workload_identity:tenant-id:second-client-id"
+    assert first.get_token("scope").token == "token-1"
+    assert second.get_token("scope").token == "token-1"
+    assert first.credential.calls == second.credential.calls == 1
+
+
+def test_file_token_cache_requires_encryption_by_default(cache_path, monkeypatch):
+    def fail(_location):
+        raise OSError("no libsecret")
+
+    monkeypatch.setattr("msal_extensions.build_encrypted_persistence", fail)
+    with pytest.raises(errors.InterfaceError):
+        FileTokenCache(cache_path)
+
+
+def test_token_cache_url_parameters():
+    engine = create_engine(
+        "kustokql+https://localhost/testdb?msi=true"
+        "&token_cache_path=/tmp/tokens.bin&token_cache_allow_unencrypted=true"
+    )
+    _, kwargs = engine.dialect.create_connect_args(engine.url)
+    assert kwargs["token_cache_path"] == "/tmp/tokens.bin"
+    assert kwargs["token_cache_allow_unencrypted"] is True